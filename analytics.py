@@ -0,0 +1,146 @@
+import io
+import csv
+import metrics
+from cache import LRUCache
+from attendance_store import normalize_name
+
+PAGE_SIZE = 100
+EXPORT_CHUNK_SIZE = 10000
+
+# Query results per (database, revision, query); a new attendance write changes the
+# revision, so stale entries are simply never looked up again and age out of the LRU
+_cache = LRUCache(maxsize=128, ttl=None)
+
+_RECORD_COLUMNS = "name AS Name, date AS Date, time AS Time, status AS Status"
+
+
+def _cached(store, key, compute):
+    full_key = (store.db_path, store.revision(), key)
+    hit, value = _cache.get(full_key)
+    if hit:
+        return value
+    value = compute()
+    _cache.put(full_key, value)
+    return value
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def _collect_metrics():
+    stats = _cache.stats()
+    labels = {"cache": "analytics"}
+    return [
+        ("face_cache_hits_total", "counter", stats["hits"], labels),
+        ("face_cache_misses_total", "counter", stats["misses"], labels),
+        ("face_cache_hit_ratio", "gauge", stats["hit_rate"], labels),
+        ("face_cache_entries", "gauge", stats["size"], labels),
+    ]
+
+
+metrics.set_collector("analytics_cache", _collect_metrics)
+
+
+# Function to get overall totals from the per-day aggregates (no scan of the log)
+def get_summary(store):
+    def compute():
+        df = store.read_sql(
+            "SELECT COALESCE(SUM(total), 0) AS total, COALESCE(SUM(present), 0) AS present, "
+            "COALESCE(SUM(absent), 0) AS absent, (SELECT COUNT(*) FROM user_stats) AS users FROM daily_stats"
+        )
+        row = df.iloc[0]
+        return {
+            "total": int(row["total"]),
+            "unique_users": int(row["users"]),
+            "present": int(row["present"]),
+            "absent": int(row["absent"]),
+        }
+    return _cached(store, ("summary",), compute)
+
+
+# Function to get per-day counts (Date, Present, Absent, Total), newest first
+def get_daily_stats(store):
+    return _cached(store, ("daily",), lambda: store.read_sql(
+        "SELECT date AS Date, present AS Present, absent AS Absent, total AS Total "
+        "FROM daily_stats ORDER BY date DESC"
+    ))
+
+
+# Function to get per-user counts (Name, Present, Absent, Total), by name
+def get_user_stats(store):
+    return _cached(store, ("users",), lambda: store.read_sql(
+        "SELECT name AS Name, present AS Present, absent AS Absent, total AS Total "
+        "FROM user_stats ORDER BY name COLLATE NOCASE"
+    ))
+
+
+# Function to get every user's record count keyed by normalized name (one query, cached per revision)
+def get_attendance_counts(store):
+    def compute():
+        df = store.read_sql("SELECT name_key, total FROM user_stats")
+        return dict(zip(df["name_key"], df["total"].astype(int)))
+    return _cached(store, ("counts",), compute)
+
+
+def _where(names=None, date_str=None, status=None):
+    clauses = []
+    params = []
+    if names:
+        keys = sorted({normalize_name(name) for name in names})
+        clauses.append(f"name_key IN ({', '.join('?' * len(keys))})")
+        params.extend(keys)
+    if date_str:
+        clauses.append("date = ?")
+        params.append(date_str)
+    if status and status != "All":
+        clauses.append("status = ?")
+        params.append(status)
+    sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return sql, tuple(params)
+
+
+# Function to count the records matching the filters
+def count_records(store, names=None, date_str=None, status=None):
+    where, params = _where(names, date_str, status)
+    if not where:
+        return get_summary(store)["total"]
+    key = ("count", where, params)
+    return _cached(store, key, lambda: int(
+        store.read_sql("SELECT COUNT(*) AS n FROM attendance" + where, params).iloc[0]["n"]
+    ))
+
+
+# Function to get one page of matching records, newest first (page numbers start at 1)
+def get_page(store, page=1, page_size=PAGE_SIZE, names=None, date_str=None, status=None):
+    where, params = _where(names, date_str, status)
+    offset = max(0, page - 1) * page_size
+    key = ("page", where, params, page_size, offset)
+    return _cached(store, key, lambda: store.read_sql(
+        f"SELECT {_RECORD_COLUMNS} FROM attendance{where} "
+        "ORDER BY date DESC, time DESC, id DESC LIMIT ? OFFSET ?",
+        params + (page_size, offset)
+    ))
+
+
+# Generator: matching records as CSV text, chunk by chunk (header first)
+def iter_csv(store, names=None, date_str=None, status=None, chunk_size=EXPORT_CHUNK_SIZE):
+    where, params = _where(names, date_str, status)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["Name", "Date", "Time", "Status"])
+    yield buffer.getvalue()
+    sql = f"SELECT name, date, time, status FROM attendance{where} ORDER BY date DESC, time DESC, id DESC"
+    for rows in store.iter_rows(sql, params, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+# Function to stream the matching records into a binary file object (e.g. a temporary file)
+def export_csv(store, file, names=None, date_str=None, status=None):
+    for chunk in iter_csv(store, names, date_str, status):
+        file.write(chunk.encode("utf-8"))
+    file.seek(0)
+    return file
@@ -1,85 +1,133 @@
+import time
+# First-run import time is recorded as a startup phase (see metrics.startup_phases)
+_script_started = time.perf_counter()
 import streamlit as st
 import pandas as pd
 import os
+import tempfile
 from datetime import datetime
 from PIL import Image
-from deepface import DeepFace
-import shutil
+from concurrent.futures import TimeoutError
+from gallery import get_gallery, GalleryLoadError, TEMPLATES_PER_IDENTITY
+from quality import select_best
+from liveness import REJECTION_MESSAGES
+from cache import frame_key
+import analytics
+import metrics
+from attendance_store import get_store, normalize_name
+from workers import get_pool, peek_pool, QueueFullError
+
+metrics.record_startup_phase("imports", time.perf_counter() - _script_started)
 
 st.set_page_config(page_title="Face Recognition Attendance", layout="wide")
 
+# Write metrics.prom every few seconds (and serve /metrics if FACE_METRICS_PORT is set)
+metrics.start_exporter()
+
 # Folder to store registered faces
 TRAIN_DIR = "registered_faces"
 os.makedirs(TRAIN_DIR, exist_ok=True)
 
+# Folder for downsized copies of the registered photos (Manage Users page)
+THUMB_DIR = "thumbnails"
+THUMB_SIZE = (200, 200)
+
+# Users shown per page on the Manage Users page
+USERS_PER_PAGE = 20
+
+# Pages that run face recognition; only these wait for the worker pool and the face model
+RECOGNITION_PAGES = ("👤 Registration", "✅ Mark Attendance")
+# Start the worker pool (each worker imports TensorFlow and preloads the model) right after the
+# first page has been sent, so the first check-in is fast; False = only when a recognition page opens
+PRELOAD_RECOGNITION = True
+
+# Legacy CSV log, imported once into the attendance database
 ATTENDANCE_FILE = "attendance.csv"
 
-# Initialize or fix the CSV file
-def initialize_csv():
-    if not os.path.exists(ATTENDANCE_FILE):
-        df = pd.DataFrame(columns=["Name", "Date", "Time", "Status"])
-        df.to_csv(ATTENDANCE_FILE, index=False)
-    else:
-        # Check if file is valid
-        try:
-            df = pd.read_csv(ATTENDANCE_FILE)
-            if df.empty or not all(col in df.columns for col in ["Name", "Date", "Time", "Status"]):
-                df = pd.DataFrame(columns=["Name", "Date", "Time", "Status"])
-                df.to_csv(ATTENDANCE_FILE, index=False)
-        except:
-            df = pd.DataFrame(columns=["Name", "Date", "Time", "Status"])
-            df.to_csv(ATTENDANCE_FILE, index=False)
+# Open the attendance database and import the old CSV log on first start
+with metrics.startup_phase("store"):
+    store = get_store()
+    try:
+        store.import_csv(ATTENDANCE_FILE)
+    except Exception as e:
+        # The old log stays where it is and is imported again on the next start
+        st.warning(f"⚠️ Could not import the old attendance log {ATTENDANCE_FILE}: {e}")
 
-initialize_csv()
+# Load the face embedding gallery once (memory-mapped, no face model needed)
+with metrics.startup_phase("gallery"):
+    try:
+        gallery = get_gallery()
+    except GalleryLoadError as e:
+        # Never start with an empty gallery: the next registration would overwrite the stored faces
+        st.error(f"❌ The face gallery could not be loaded and was left untouched: {e}")
+        st.stop()
 
-# Initialize session state
-if 'last_photo' not in st.session_state:
-    st.session_state.last_photo = None
+# Initialize session state (photos are remembered by content hash, not by their bytes)
+if 'last_photo_key' not in st.session_state:
+    st.session_state.last_photo_key = None
 if 'attendance_marked' not in st.session_state:
     st.session_state.attendance_marked = False
 if 'marked_user' not in st.session_state:
     st.session_state.marked_user = None
 if 'marked_time' not in st.session_state:
     st.session_state.marked_time = None
+if 'enrol_photos' not in st.session_state:
+    st.session_state.enrol_photos = []
+if 'enrol_last_key' not in st.session_state:
+    st.session_state.enrol_last_key = None
+if 'profile_next' not in st.session_state:
+    st.session_state.profile_next = False
 
-# Function to normalize names (convert to lowercase for comparison)
-def normalize_name(name):
-    return name.strip().lower()
+# Photos captured per registration (the best ones are kept as the user's face templates)
+MAX_ENROL_PHOTOS = 5
 
-# Function to check if face already exists
-def check_duplicate_face(new_image_path):
-    registered_files = os.listdir(TRAIN_DIR)
-    for file in registered_files:
-        registered_path = os.path.join(TRAIN_DIR, file)
+# Function to embed any photos registered before the gallery existed (in the worker pool,
+# so only recognition pages run it)
+def sync_gallery():
+    if len(gallery) < len(os.listdir(TRAIN_DIR)):
         try:
-            result = DeepFace.verify(
-                new_image_path,
-                registered_path,
-                model_name='VGG-Face',
-                detector_backend='opencv',
-                enforce_detection=False,
-                distance_metric='cosine'
-            )
-            if result["verified"]:
-                return os.path.splitext(file)[0]  # Return the registered name
-        except:
-            continue
+            with metrics.startup_phase("gallery_sync"):
+                gallery.sync_with_folder(TRAIN_DIR, pool.embed_many)
+        except Exception as e:
+            st.warning(f"⚠️ Some registered photos could not be added to the face gallery yet: {e}")
+
+# Function to check if face already exists (one top-1 gallery query, threshold DUPLICATE_THRESHOLD in gallery.py)
+def check_duplicate_face(new_embeddings):
+    try:
+        match = gallery.find_duplicate(new_embeddings)
+    except:
+        return None
+    if match:
+        return match[0]  # Return the registered name
     return None
 
+# Function to get a small cached copy of a user's photo (created on first view)
+def get_thumbnail(user_path):
+    thumb_path = os.path.join(THUMB_DIR, os.path.basename(user_path))
+    if not os.path.exists(thumb_path) or os.path.getmtime(thumb_path) < os.path.getmtime(user_path):
+        os.makedirs(THUMB_DIR, exist_ok=True)
+        img = Image.open(user_path)
+        img.thumbnail(THUMB_SIZE)
+        with tempfile.NamedTemporaryFile(dir=THUMB_DIR, suffix=".jpg", delete=False) as f:
+            img.convert("RGB").save(f, "JPEG", quality=85)
+        os.replace(f.name, thumb_path)
+    return thumb_path
+
 # Function to delete user and their attendance records
 def delete_user_completely(user_name, user_path):
     try:
-        # Delete the user's photo
+        # Delete the user's photo and its thumbnail
         if os.path.exists(user_path):
             os.remove(user_path)
+        thumb_path = os.path.join(THUMB_DIR, os.path.basename(user_path))
+        if os.path.exists(thumb_path):
+            os.remove(thumb_path)
+        
+        # Delete the user's face embedding
+        gallery.remove(user_name)
         
         # Delete all attendance records for this user (case-insensitive)
-        df = pd.read_csv(ATTENDANCE_FILE)
-        if not df.empty:
-            normalized_user = normalize_name(user_name)
-            # Keep only records that don't match this user
-            df = df[df["Name"].apply(lambda x: normalize_name(x) != normalized_user)]
-            df.to_csv(ATTENDANCE_FILE, index=False)
+        store.delete_user(user_name)
         
         return True, "User and all attendance records deleted successfully"
     except Exception as e:
@@ -92,6 +140,14 @@ page = st.sidebar.radio(
     ["👤 Registration", "✅ Mark Attendance", "📊 Biometric Log History", "🗑️ Manage Users"]
 )
 
+# Recognition pages start the worker pool; the log and admin pages never wait for it
+if page in RECOGNITION_PAGES:
+    with metrics.startup_phase("worker_pool"):
+        pool = get_pool()
+    sync_gallery()
+else:
+    pool = peek_pool()
+
 st.sidebar.markdown("---")
 st.sidebar.info("**Instructions:**\n\n1. Register your face first\n2. Mark attendance daily\n3. View attendance history\n4. Manage registered users")
 
@@ -109,8 +165,25 @@ if page == "👤 Registration":
     
     with col2:
         photo_train = st.camera_input("📷 Capture Face for Registration")
+        
+        # Collect several captures of the same person
+        if photo_train is not None:
+            photo_data = photo_train.getvalue()
+            photo_key = frame_key(photo_data)
+            if photo_key != st.session_state.enrol_last_key:
+                st.session_state.enrol_last_key = photo_key
+                if len(st.session_state.enrol_photos) < MAX_ENROL_PHOTOS:
+                    st.session_state.enrol_photos.append(photo_data)
+        
+        enrol_count = len(st.session_state.enrol_photos)
+        st.write(f"**Photos captured:** {enrol_count}/{MAX_ENROL_PHOTOS}")
+        if 0 < enrol_count < MAX_ENROL_PHOTOS:
+            st.caption("📸 Clear the photo and take a few more (slightly different angle or lighting) for better recognition.")
+        if enrol_count and st.button("🔄 Start Over"):
+            st.session_state.enrol_photos = []
+            st.rerun()
     
-    if name and photo_train:
+    if name and st.session_state.enrol_photos:
         if st.button("✅ Register User", type="primary"):
             # Normalize the input name
             normalized_input = normalize_name(name)
@@ -131,36 +204,51 @@ if page == "👤 Registration":
                 st.warning(f"⚠️ User with this name already exists as '{existing_name}'!")
             else:
                 try:
-                    # Save temporary image
-                    image = Image.open(photo_train)
-                    temp_path = "temp_registration.jpg"
-                    image.save(temp_path)
+                    photos = st.session_state.enrol_photos
+                    
+                    # Detect, quality-score and embed every capture in the workers (one micro-batch)
+                    with metrics.timer("face_request_seconds", route="register"):
+                        results = pool.embed_many(photos)
+                    qualities = [quality for _, _, quality in results]
+                    best = select_best(qualities, TEMPLATES_PER_IDENTITY)
                     
-                    # Check for duplicate face
-                    duplicate_user = check_duplicate_face(temp_path)
+                    rejections = [quality["rejected"] for quality in qualities if quality and quality.get("rejected")]
                     
-                    if duplicate_user:
-                        st.error(f"❌ This face is already registered as '{duplicate_user}'!")
-                        st.warning("⚠️ Same person cannot register with different names.")
-                        os.remove(temp_path)
+                    if all(quality is None for quality in qualities):
+                        st.error("❌ No face detected in the image. Please try again with better lighting.")
+                    elif not best and rejections:
+                        metrics.inc("face_registrations_total", result="rejected")
+                        st.error(f"❌ Photo rejected: {REJECTION_MESSAGES.get(rejections[0], rejections[0])}. Please try again.")
+                    elif not best:
+                        st.error("❌ Photo quality too low (blurry, too dark/bright, too far or not facing the camera). Please try again.")
                     else:
-                        # Test if face is detectable
-                        test_result = DeepFace.extract_faces(temp_path, enforce_detection=False)
+                        embeddings = [results[i][0] for i in best]
+                        
+                        # Check for duplicate face
+                        duplicate_user = check_duplicate_face(embeddings)
                         
-                        if test_result:
-                            # Save with original name (preserving case)
+                        if duplicate_user:
+                            metrics.inc("face_registrations_total", result="duplicate")
+                            st.error(f"❌ This face is already registered as '{duplicate_user}'!")
+                            st.warning("⚠️ Same person cannot register with different names.")
+                        else:
+                            # Store the best embeddings as templates (plus their centroid) in the gallery
+                            gallery.add_identity(name, embeddings)
+                            
+                            # Save the best photo's original bytes with original name (preserving case)
                             final_path = os.path.join(TRAIN_DIR, f"{name}.jpg")
-                            shutil.move(temp_path, final_path)
-                            st.success(f"✅ {name} registered successfully!")
+                            with open(final_path, "wb") as f:
+                                f.write(photos[best[0]])
+                            st.session_state.enrol_photos = []
+                            metrics.inc("face_registrations_total", result="registered")
+                            st.success(f"✅ {name} registered successfully with {len(best)} face template(s)!")
                             st.balloons()
-                        else:
-                            os.remove(temp_path)
-                            st.error("❌ No face detected in the image. Please try again with better lighting.")
                             
+                except (QueueFullError, TimeoutError):
+                    st.warning("⏳ The server is busy right now. Please try again in a moment.")
                 except Exception as e:
+                    metrics.inc("face_registrations_total", result="error")
                     st.error(f"Error during registration: {str(e)}")
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
     
     # Display registered users
     st.markdown("---")
@@ -182,16 +270,10 @@ elif page == "✅ Mark Attendance":
     
     # Check today's attendance status BEFORE camera input
     try:
-        df = pd.read_csv(ATTENDANCE_FILE)
-        if df.empty or 'Date' not in df.columns:
-            today_attendance = pd.DataFrame()
-        else:
-            today_date = datetime.now().strftime("%Y-%m-%d")
-            today_attendance = df[df["Date"] == today_date]
+        today_date = datetime.now().strftime("%Y-%m-%d")
+        today_attendance = store.records_for_date(today_date)
     except Exception as e:
         today_attendance = pd.DataFrame()
-        df = pd.DataFrame(columns=["Name", "Date", "Time", "Status"])
-        df.to_csv(ATTENDANCE_FILE, index=False)
     
     # Display attendance status at the top
     st.markdown("---")
@@ -235,145 +317,154 @@ elif page == "✅ Mark Attendance":
         photo_bytes = photo_attendance.getvalue()
         
         # Check if this is a new photo (different from last processed)
-        if st.session_state.last_photo != photo_bytes:
-            st.session_state.last_photo = photo_bytes
+        photo_key = frame_key(photo_bytes)
+        if st.session_state.last_photo_key != photo_key:
+            st.session_state.last_photo_key = photo_key
             st.session_state.attendance_marked = False
             st.session_state.marked_user = None
             
             with st.spinner("🔍 Verifying face... Please wait..."):
-                df = pd.read_csv(ATTENDANCE_FILE)
-                img = Image.open(photo_attendance)
-                img_path = "temp_attendance.jpg"
-                img.save(img_path)
-                
                 found = False
                 matched_name = None
+                busy = False
+                rejection = None
+                error = None
                 
                 registered_files = os.listdir(TRAIN_DIR)
                 
                 if not registered_files:
                     st.error("❌ No registered users found. Please register first!")
                 else:
-                    for file in registered_files:
-                        registered_name = os.path.splitext(file)[0]
-                        registered_path = os.path.join(TRAIN_DIR, file)
+                    # One detection and embedding pass for the probe, one vectorized comparison against the gallery.
+                    # In profiling mode the worker runs the request under cProfile and returns the dump's path.
+                    profile_request = st.session_state.profile_next
+                    st.session_state.profile_next = False
+                    profile_path = None
+                    probe_embedding = None
+                    face_quality = None
+                    try:
+                        with metrics.timer("face_request_seconds", route="checkin"):
+                            if profile_request:
+                                (probe_embedding, face_box, face_quality), profile_path = pool.profile(photo_bytes)
+                            else:
+                                probe_embedding, face_box, face_quality = pool.embed(photo_bytes)
+                            match = gallery.match(probe_embedding) if probe_embedding is not None else None
+                    except (QueueFullError, TimeoutError):
+                        match = None
+                        busy = True
+                    except Exception as e:
+                        # e.g. a worker process died; the pool is replaced on the next rerun
+                        match = None
+                        error = str(e) or type(e).__name__
+                    if profile_path:
+                        st.info(f"🔬 Profile saved to {profile_path} (summary in the .txt next to it)")
+                    
+                    # Captures rejected by the liveness pre-filter never reached the model
+                    if face_quality and face_quality.get("rejected"):
+                        rejection = face_quality["rejected"]
+                    
+                    if busy:
+                        metrics.inc("face_checkins_total", result="busy")
+                    elif error:
+                        metrics.inc("face_checkins_total", result="error")
+                    elif rejection:
+                        metrics.inc("face_checkins_total", result="rejected")
+                    elif probe_embedding is None:
+                        metrics.inc("face_checkins_total", result="no_face")
+                    elif not match:
+                        metrics.inc("face_checkins_total", result="unknown")
+                    
+                    if match:
+                        registered_name = match[0]
+                        found = True
+                        matched_name = registered_name
+                        now = datetime.now()
+                        date_str = now.strftime("%Y-%m-%d")
+                        time_str = now.strftime("%H:%M:%S")
+                        
+                        # Append the entry unless already marked present today (case-insensitive unique index)
+                        newly_marked = store.mark_present(registered_name, date_str, time_str)
+                        
+                        metrics.inc("face_checkins_total", result="marked" if newly_marked else "already_marked")
                         
-                        try:
-                            # Use less strict verification settings
-                            result = DeepFace.verify(
-                                img_path, 
-                                registered_path,
-                                model_name='VGG-Face',
-                                detector_backend='opencv',
-                                enforce_detection=False,
-                                distance_metric='cosine'
-                            )
+                        if newly_marked:
+                            # Update session state
+                            st.session_state.attendance_marked = True
+                            st.session_state.marked_user = registered_name
+                            st.session_state.marked_time = time_str
                             
-                            if result["verified"]:
-                                found = True
-                                matched_name = registered_name
-                                now = datetime.now()
-                                date_str = now.strftime("%Y-%m-%d")
-                                time_str = now.strftime("%H:%M:%S")
-                                
-                                # Check if already marked present today (case-insensitive)
-                                if df.empty:
-                                    already_marked = False
-                                else:
-                                    already_marked = False
-                                    for _, row in df.iterrows():
-                                        if (normalize_name(row["Name"]) == normalize_name(registered_name) and 
-                                            row["Date"] == date_str and 
-                                            row["Status"] == "Present"):
-                                            already_marked = True
-                                            break
-                                
-                                if not already_marked:
-                                    new_entry = pd.DataFrame(
-                                        [[registered_name, date_str, time_str, "Present"]], 
-                                        columns=["Name", "Date", "Time", "Status"]
-                                    )
-                                    df = pd.concat([df, new_entry], ignore_index=True)
-                                    df.to_csv(ATTENDANCE_FILE, index=False)
-                                    
-                                    # Update session state
-                                    st.session_state.attendance_marked = True
-                                    st.session_state.marked_user = registered_name
-                                    st.session_state.marked_time = time_str
-                                    
-                                    # Show BIG success message
-                                    st.success("# ✅ ATTENDANCE MARKED SUCCESSFULLY!")
-                                    st.balloons()
-                                    
-                                    # Show details in a highlighted box
-                                    st.markdown(f"""
-                                    <div style="background-color: #d4edda; padding: 20px; border-radius: 10px; border: 2px solid #28a745;">
-                                        <h2 style="color: #155724;">👤 {registered_name}</h2>
-                                        <h3 style="color: #155724;">✅ Status: PRESENT</h3>
-                                        <h3 style="color: #155724;">🕐 Time: {time_str}</h3>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                    
-                                    # Show recent attendance immediately
-                                    st.markdown("---")
-                                    st.subheader("📋 Recent Attendance Log")
-                                    recent_df = pd.read_csv(ATTENDANCE_FILE)
-                                    recent_entries = recent_df.tail(10).sort_values(by=["Date", "Time"], ascending=False)
-                                    st.dataframe(recent_entries, use_container_width=True, hide_index=True)
-                                    
-                                    # Force rerun to update status at top
-                                    st.rerun()
-                                else:
-                                    st.warning(f"⚠️ **{registered_name}**, you've already marked attendance today!")
-                                    
-                                    # Show today's attendance
-                                    st.markdown("---")
-                                    st.subheader("📋 Today's Attendance")
-                                    today_df = pd.read_csv(ATTENDANCE_FILE)
-                                    today_entries = today_df[today_df["Date"] == date_str]
-                                    if len(today_entries) > 0:
-                                        st.dataframe(today_entries, use_container_width=True, hide_index=True)
-                                    else:
-                                        st.info("No attendance records for today yet.")
-                                break
-                                
-                        except Exception as e:
-                            continue
-                    
-                    if not found:
+                            # Show BIG success message
+                            st.success("# ✅ ATTENDANCE MARKED SUCCESSFULLY!")
+                            st.balloons()
+                            
+                            # Show details in a highlighted box
+                            st.markdown(f"""
+                            <div style="background-color: #d4edda; padding: 20px; border-radius: 10px; border: 2px solid #28a745;">
+                                <h2 style="color: #155724;">👤 {registered_name}</h2>
+                                <h3 style="color: #155724;">✅ Status: PRESENT</h3>
+                                <h3 style="color: #155724;">🕐 Time: {time_str}</h3>
+                            </div>
+                            """, unsafe_allow_html=True)
+                            
+                            # Show recent attendance immediately
+                            st.markdown("---")
+                            st.subheader("📋 Recent Attendance Log")
+                            recent_entries = store.recent(10).sort_values(by=["Date", "Time"], ascending=False)
+                            st.dataframe(recent_entries, use_container_width=True, hide_index=True)
+                            
+                            # Force rerun to update status at top
+                            st.rerun()
+                        else:
+                            st.warning(f"⚠️ **{registered_name}**, you've already marked attendance today!")
+                            
+                            # Show today's attendance
+                            st.markdown("---")
+                            st.subheader("📋 Today's Attendance")
+                            today_entries = store.records_for_date(date_str)
+                            if len(today_entries) > 0:
+                                st.dataframe(today_entries, use_container_width=True, hide_index=True)
+                            else:
+                                st.info("No attendance records for today yet.")
+
+                    if busy:
+                        # Let the same photo be submitted again
+                        st.session_state.last_photo_key = None
+                        st.warning("⏳ The server is busy right now. Please try again in a moment.")
+                    elif error:
+                        # Let the same photo be submitted again once recognition works again
+                        st.session_state.last_photo_key = None
+                        st.error(f"⚠️ Face recognition failed: {error}")
+                        st.warning("Please try again in a moment.")
+                    elif rejection:
+                        st.error(f"# ❌ CAPTURE REJECTED: {REJECTION_MESSAGES.get(rejection, rejection)}")
+                        st.warning("Please look straight at the camera in good light and try again.")
+                    elif not found:
                         st.error("# ❌ FACE NOT RECOGNIZED!")
                         st.warning("Please try again or register first.")
-                
-                # Clean up temp file
-                if os.path.exists(img_path):
-                    os.remove(img_path)
 
 # --------------------- Page 3: Biometric Log History ---------------------
 elif page == "📊 Biometric Log History":
     st.title("📊 Biometric Log History")
     st.write("View complete attendance records and statistics.")
     
-    df = pd.read_csv(ATTENDANCE_FILE)
+    # Totals come from aggregates kept up to date on every write (cached until the next write)
+    summary = analytics.get_summary(store)
     
-    if not df.empty:
+    if summary["total"] > 0:
         # Statistics
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            total_entries = len(df)
-            st.metric("Total Records", total_entries)
+            st.metric("Total Records", summary["total"])
         
         with col2:
-            unique_users = df["Name"].nunique()
-            st.metric("Unique Users", unique_users)
+            st.metric("Unique Users", summary["unique_users"])
         
         with col3:
-            present_count = len(df[df["Status"] == "Present"])
-            st.metric("Present", present_count)
+            st.metric("Present", summary["present"])
         
         with col4:
-            absent_count = len(df[df["Status"] == "Absent"])
-            st.metric("Absent", absent_count)
+            st.metric("Absent", summary["absent"])
         
         st.markdown("---")
         
@@ -382,7 +473,7 @@ elif page == "📊 Biometric Log History":
         with col1:
             name_filter = st.multiselect(
                 "Filter by Name",
-                options=sorted(df["Name"].unique()),
+                options=analytics.get_user_stats(store)["Name"].tolist(),
                 default=None
             )
         
@@ -395,35 +486,39 @@ elif page == "📊 Biometric Log History":
                 options=["All", "Present", "Absent"]
             )
         
-        # Apply filters
-        filtered_df = df.copy()
-        if name_filter:
-            filtered_df = filtered_df[filtered_df["Name"].isin(name_filter)]
-        if date_filter:
-            filtered_df = filtered_df[filtered_df["Date"] == date_filter.strftime("%Y-%m-%d")]
-        if status_filter != "All":
-            filtered_df = filtered_df[filtered_df["Status"] == status_filter]
+        # Filters are applied in the database; only the visible page is loaded
+        date_str = date_filter.strftime("%Y-%m-%d") if date_filter else None
+        filtered_count = analytics.count_records(store, name_filter, date_str, status_filter)
         
         # Display table
         st.markdown("---")
-        st.subheader(f"📋 Attendance Records ({len(filtered_df)} entries)")
+        st.subheader(f"📋 Attendance Records ({filtered_count} entries)")
         
-        if len(filtered_df) > 0:
+        if filtered_count > 0:
+            col_size, col_page = st.columns(2)
+            with col_size:
+                page_size = st.selectbox("Rows per page", options=[50, 100, 500], index=1)
+            total_pages = (filtered_count + page_size - 1) // page_size
+            with col_page:
+                page_number = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+            
             st.dataframe(
-                filtered_df.sort_values(by=["Date", "Time"], ascending=False),
+                analytics.get_page(store, page_number, page_size, name_filter, date_str, status_filter),
                 use_container_width=True,
                 hide_index=True
             )
+            st.caption(f"Page {page_number} of {total_pages}")
             
-            # Download button
-            csv = filtered_df.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="📥 Download CSV",
-                data=csv,
-                file_name=f"attendance_log_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv",
-                type="primary"
-            )
+            # CSV is only generated when asked for, streamed from the database in chunks
+            if st.button("📄 Prepare CSV Download"):
+                csv_file = analytics.export_csv(store, tempfile.TemporaryFile(), name_filter, date_str, status_filter)
+                st.download_button(
+                    label="📥 Download CSV",
+                    data=csv_file,
+                    file_name=f"attendance_log_{datetime.now().strftime('%Y%m%d')}.csv",
+                    mime="text/csv",
+                    type="primary"
+                )
         else:
             st.info("📭 No records match the selected filters.")
         
@@ -437,23 +532,34 @@ elif page == "🗑️ Manage Users":
     st.write("View and delete registered users from the system.")
     st.warning("⚠️ **Warning:** Deleting a user will remove their photo AND all attendance records permanently!")
     
-    registered_files = os.listdir(TRAIN_DIR)
+    registered_files = sorted(os.listdir(TRAIN_DIR))
     
     if registered_files:
         st.write(f"**Total Registered Users:** {len(registered_files)}")
+        
+        # Attendance counts for every user from one cached query (refreshed when records change)
+        attendance_counts = analytics.get_attendance_counts(store)
+        
+        # Search and pagination
+        col_search, col_page = st.columns([3, 1])
+        with col_search:
+            search = st.text_input("🔍 Search users", placeholder="Type part of a name")
+        if search:
+            registered_files = [f for f in registered_files if normalize_name(search) in normalize_name(f)]
+        total_pages = max(1, (len(registered_files) + USERS_PER_PAGE - 1) // USERS_PER_PAGE)
+        with col_page:
+            page_number = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+        st.caption(f"Showing {len(registered_files)} user(s), page {page_number} of {total_pages}")
         st.markdown("---")
         
         # Display users with delete buttons
-        for file in sorted(registered_files):
+        page_start = (page_number - 1) * USERS_PER_PAGE
+        for file in registered_files[page_start:page_start + USERS_PER_PAGE]:
             user_name = os.path.splitext(file)[0]
             user_path = os.path.join(TRAIN_DIR, file)
             
             # Check attendance count for this user
-            df = pd.read_csv(ATTENDANCE_FILE)
-            if not df.empty:
-                user_attendance_count = len(df[df["Name"].apply(lambda x: normalize_name(x) == normalize_name(user_name))])
-            else:
-                user_attendance_count = 0
+            user_attendance_count = attendance_counts.get(normalize_name(user_name), 0)
             
             col1, col2, col3 = st.columns([3, 1, 1])
             
@@ -473,8 +579,7 @@ elif page == "🗑️ Manage Users":
             # Show image if view is clicked
             if st.session_state.get(f"show_{user_name}", False):
                 try:
-                    img = Image.open(user_path)
-                    st.image(img, width=200, caption=user_name)
+                    st.image(get_thumbnail(user_path), width=200, caption=user_name)
                 except:
                     st.error("Could not load image")
             
@@ -508,6 +613,42 @@ elif page == "🗑️ Manage Users":
         st.info("📭 No registered users found.")
         st.write("Go to **Registration** page to register users.")
 
+# Model status
+st.sidebar.markdown("---")
+model_health = pool.health() if pool is not None else {"status": "not_started"}
+if model_health["status"] == "not_started":
+    st.sidebar.info("⚪ Face model not loaded yet")
+elif model_health["status"] == "ready":
+    st.sidebar.success(f"🟢 Face model ready (loaded in {model_health['warmup_total_seconds']:.1f}s)")
+elif model_health["status"] == "warming":
+    st.sidebar.warning("🟡 Face model is loading...")
+else:
+    st.sidebar.error(f"🔴 Face model failed to load: {model_health['warmup_error']}")
+
+# Per-stage latency of this server process (all stages, including those run in the workers)
+with st.sidebar.expander("📈 Performance"):
+    stage_rows = metrics.registry.stage_summary()
+    if stage_rows:
+        st.dataframe(pd.DataFrame(stage_rows).round(1), use_container_width=True, hide_index=True)
+    else:
+        st.caption("No requests timed yet.")
+    if pool is not None:
+        pool_stats = pool.stats()
+        st.caption(f"Queue depth: {pool_stats['queue_depth']} · Probe cache hit rate: {pool_stats['cache']['hit_rate']:.0%}")
+    if metrics.startup_phases:
+        st.caption("Startup: " + " · ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in metrics.startup_phases.items()))
+    if metrics.PROFILING_ENABLED:
+        if st.button("🔬 Profile next check-in"):
+            st.session_state.profile_next = True
+        if st.session_state.profile_next:
+            st.caption("The next check-in will be profiled with cProfile.")
+
 # Footer
 st.sidebar.markdown("---")
 st.sidebar.caption("Face Recognition Attendance System v1.0")
+
+# The whole first run of the script, i.e. until the first page was sent to the browser
+metrics.record_startup_phase("first_page", time.perf_counter() - _script_started)
+
+if pool is None and PRELOAD_RECOGNITION:
+    get_pool()
@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+from metrics import stage
+
+ATTENDANCE_DB = "attendance.db"
+COLUMNS = ["Name", "Date", "Time", "Status"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+-- One 'Present' entry per person per day; also makes the "already marked" check a point lookup
+CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_present
+    ON attendance (name_key, date) WHERE status = 'Present';
+CREATE INDEX IF NOT EXISTS idx_attendance_date_time ON attendance (date, time);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', '0');
+
+-- Per-day and per-user counts, kept up to date by triggers in the same transaction as each write
+CREATE TABLE IF NOT EXISTS daily_stats (
+    date TEXT PRIMARY KEY,
+    present INTEGER NOT NULL DEFAULT 0,
+    absent INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS user_stats (
+    name_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    present INTEGER NOT NULL DEFAULT 0,
+    absent INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS attendance_after_insert AFTER INSERT ON attendance BEGIN
+    INSERT OR IGNORE INTO daily_stats (date) VALUES (NEW.date);
+    UPDATE daily_stats SET
+        present = present + (NEW.status = 'Present'),
+        absent = absent + (NEW.status = 'Absent'),
+        total = total + 1
+    WHERE date = NEW.date;
+    INSERT OR IGNORE INTO user_stats (name_key, name) VALUES (NEW.name_key, NEW.name);
+    UPDATE user_stats SET
+        present = present + (NEW.status = 'Present'),
+        absent = absent + (NEW.status = 'Absent'),
+        total = total + 1
+    WHERE name_key = NEW.name_key;
+    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'revision';
+END;
+CREATE TRIGGER IF NOT EXISTS attendance_after_delete AFTER DELETE ON attendance BEGIN
+    UPDATE daily_stats SET
+        present = present - (OLD.status = 'Present'),
+        absent = absent - (OLD.status = 'Absent'),
+        total = total - 1
+    WHERE date = OLD.date;
+    DELETE FROM daily_stats WHERE date = OLD.date AND total <= 0;
+    UPDATE user_stats SET
+        present = present - (OLD.status = 'Present'),
+        absent = absent - (OLD.status = 'Absent'),
+        total = total - 1
+    WHERE name_key = OLD.name_key;
+    DELETE FROM user_stats WHERE name_key = OLD.name_key AND total <= 0;
+    UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'revision';
+END;
+"""
+
+_SELECT = "SELECT name AS Name, date AS Date, time AS Time, status AS Status FROM attendance"
+
+
+# Function to normalize names (convert to lowercase for comparison)
+def normalize_name(name):
+    return name.strip().lower()
+
+
+class AttendanceStore:
+    # Attendance log in SQLite (WAL mode): O(1) appends, safe concurrent writers,
+    # and no whole-file rewrites. Each thread gets its own connection.
+    def __init__(self, db_path=ATTENDANCE_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # Import an existing attendance.csv once (the CSV itself is left untouched). Damaged rows, such
+    # as a last line cut short by a crash, are skipped. If the file cannot be read at all the error
+    # is raised and nothing is recorded, so the import is tried again on the next start.
+    def import_csv(self, csv_path):
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'csv_imported'").fetchone():
+            return 0
+        rows = []
+        if os.path.exists(csv_path):
+            # The python parser also skips a row left with an unterminated quote at the end of the file
+            df = pd.read_csv(csv_path, dtype=str, engine="python", on_bad_lines="skip").dropna(subset=COLUMNS)
+            rows = [
+                (row.Name, normalize_name(row.Name), row.Date, row.Time, row.Status)
+                for row in df[COLUMNS].itertuples(index=False)
+            ]
+        with conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO attendance (name, name_key, date, time, status) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_imported', ?)", (csv_path,))
+        return max(cursor.rowcount, 0)
+
+    # Append a 'Present' entry; returns False if the person was already marked that day
+    def mark_present(self, name, date_str, time_str):
+        conn = self._connect()
+        with stage("storage"), conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO attendance (name, name_key, date, time, status) VALUES (?, ?, ?, ?, 'Present')",
+                (name, normalize_name(name), date_str, time_str)
+            )
+        return cursor.rowcount == 1
+
+    # Append several (name, date, time) 'Present' entries in one transaction.
+    # Returns one flag per entry: True if written, False if already marked that day.
+    def mark_present_many(self, entries):
+        conn = self._connect()
+        written = []
+        with stage("storage"), conn:
+            for name, date_str, time_str in entries:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO attendance (name, name_key, date, time, status) VALUES (?, ?, ?, ?, 'Present')",
+                    (name, normalize_name(name), date_str, time_str)
+                )
+                written.append(cursor.rowcount == 1)
+        return written
+
+    def records_for_date(self, date_str):
+        return pd.read_sql_query(_SELECT + " WHERE date = ? ORDER BY id", self._connect(), params=(date_str,))
+
+    def recent(self, limit=10):
+        return pd.read_sql_query(_SELECT + " ORDER BY id DESC LIMIT ?", self._connect(), params=(limit,))
+
+    # Counter bumped by every insert or delete (from any process); used to invalidate cached analytics
+    def revision(self):
+        return int(self._connect().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0])
+
+    # Run a read-only query and return the result as a DataFrame
+    def read_sql(self, sql, params=()):
+        return pd.read_sql_query(sql, self._connect(), params=params)
+
+    # Run a read-only query and yield rows in chunks (never loads the whole result)
+    def iter_rows(self, sql, params=(), chunk_size=10000):
+        cursor = self._connect().execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+
+    # Delete every record of a user (case-insensitive); returns the number of rows removed
+    def delete_user(self, name):
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute("DELETE FROM attendance WHERE name_key = ?", (normalize_name(name),))
+        return cursor.rowcount
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+# Function to get the shared attendance store (opened once per process)
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AttendanceStore()
+        return _store
@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from detection import detect_faces, crop_face
+from gallery import get_gallery, compute_embeddings
+from attendance_store import get_store, normalize_name
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+# Images processed at the same time (OpenCV and TensorFlow release the GIL)
+MAX_WORKERS = 4
+
+
+# Function to detect every face in a frame and recognise them all with one batched model call.
+# Returns a list of {"box", "name", "distance"} (name is None for unknown faces).
+def recognize_frame(frame, gallery):
+    boxes = detect_faces(frame)
+    if not boxes:
+        return []
+    embeddings = compute_embeddings([crop_face(frame, box) for box in boxes])
+    valid = [i for i, e in enumerate(embeddings) if e is not None]
+    matches = [None] * len(boxes)
+    for i, match in zip(valid, gallery.match_many([embeddings[i] for i in valid])):
+        matches[i] = match
+    faces = []
+    for box, match in zip(boxes, matches):
+        faces.append({
+            "box": box,
+            "name": match[0] if match else None,
+            "distance": match[1] if match else None,
+        })
+    return faces
+
+
+# Function to expand folders into the image files they contain (sorted, non-recursive)
+def iter_image_paths(sources):
+    if isinstance(sources, str):
+        sources = [sources]
+    for source in sources:
+        if os.path.isdir(source):
+            for file in sorted(os.listdir(source)):
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(source, file)
+        else:
+            yield source
+
+
+def _recognize_path(path, gallery):
+    frame = cv2.imread(path)
+    if frame is None:
+        return None
+    return recognize_frame(frame, gallery)
+
+
+# Function to run recognition over many images with a bounded worker pool.
+# Yields (path, faces) in input order; faces is None if the image could not be read.
+def recognize_images(sources, gallery, max_workers=MAX_WORKERS):
+    # At most 2 * max_workers images are in flight, so huge folders are never loaded at once
+    slots = threading.BoundedSemaphore(max_workers * 2)
+    pending = []
+
+    def run(path):
+        try:
+            return _recognize_path(path, gallery)
+        except Exception:
+            return None
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for path in iter_image_paths(sources):
+            slots.acquire()
+            pending.append((path, pool.submit(run, path)))
+            while pending and pending[0][1].done():
+                path_done, future = pending.pop(0)
+                yield path_done, future.result()
+        for path_done, future in pending:
+            yield path_done, future.result()
+
+
+# Function to mark every recognised face as present in one transaction and summarise the result.
+# results: iterable of (timestamp, faces) pairs.
+def check_in(results, store):
+    summary = {"images": 0, "faces": 0, "matched": 0, "duplicate": 0, "unknown": 0, "unreadable": 0, "marked": []}
+    entries = []
+    seen = set()
+    for timestamp, faces in results:
+        summary["images"] += 1
+        if faces is None:
+            summary["unreadable"] += 1
+            continue
+        date_str = timestamp.strftime("%Y-%m-%d")
+        time_str = timestamp.strftime("%H:%M:%S")
+        for face in faces:
+            summary["faces"] += 1
+            if face["name"] is None:
+                summary["unknown"] += 1
+                continue
+            key = (normalize_name(face["name"]), date_str)
+            if key in seen:
+                # Same person seen more than once in this batch
+                summary["duplicate"] += 1
+                continue
+            seen.add(key)
+            entries.append((face["name"], date_str, time_str))
+    for entry, written in zip(entries, store.mark_present_many(entries)):
+        if written:
+            summary["matched"] += 1
+            summary["marked"].append({"name": entry[0], "date": entry[1], "time": entry[2]})
+        else:
+            # Already marked on that day before this batch
+            summary["duplicate"] += 1
+    return summary
+
+
+# Function to check in everybody visible in one frame (e.g. a classroom or entrance photo)
+def check_in_frame(frame, gallery=None, store=None, timestamp=None):
+    if gallery is None:
+        gallery = get_gallery()
+    if store is None:
+        store = get_store()
+    faces = recognize_frame(frame, gallery)
+    return check_in([(timestamp or datetime.now(), faces)], store)
+
+
+# Function to backfill attendance from a folder or list of images.
+# With use_file_time the record date/time is taken from each file's modification time.
+def check_in_images(sources, gallery=None, store=None, max_workers=MAX_WORKERS, use_file_time=True):
+    if gallery is None:
+        gallery = get_gallery()
+    if store is None:
+        store = get_store()
+    now = datetime.now()
+    results = []
+    for path, faces in recognize_images(sources, gallery, max_workers):
+        timestamp = now
+        if use_file_time and os.path.exists(path):
+            timestamp = datetime.fromtimestamp(os.path.getmtime(path))
+        results.append((timestamp, faces))
+    return check_in(results, store)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch attendance check-in from group photos or image folders")
+    parser.add_argument("sources", nargs="+", help="Image files and/or folders of images")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Number of images processed in parallel")
+    parser.add_argument("--now", action="store_true", help="Use the current time instead of each file's modification time")
+    args = parser.parse_args(argv)
+
+    summary = check_in_images(args.sources, max_workers=args.workers, use_file_time=not args.now)
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
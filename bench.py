@@ -0,0 +1,631 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import date, datetime, timedelta
+import numpy as np
+import analytics
+from attendance_store import AttendanceStore
+from gallery import FaceGallery, TEMPLATES_PER_IDENTITY, COSINE_THRESHOLD
+from matching import MatchEngine, ANN_MIN_GALLERY_SIZE
+
+# Synthetic gallery sizes (identities) and attendance log sizes (rows) benchmarked by default
+GALLERY_SIZES = [10, 1000, 10000, 100000]
+LOG_SIZES = [10000, 1000000]
+# VGG-Face embeddings have 4096 values
+EMBEDDING_DIM = 4096
+# Timed calls per operation
+REPEATS = 50
+# Probes recognised together in the batch benchmark
+BATCH_SIZE = 16
+# Length of the random noise added to a registered (unit-length) embedding to make a probe of the
+# same person. It is spread over all values, so the cosine distance is about 0.16 for any --dim.
+PROBE_NOISE = 0.64
+# A p50/p95 this much slower than the baseline counts as a regression
+REGRESSION_TOLERANCE = 0.2
+# ...and is at least this many milliseconds slower (smaller differences are timer noise)
+REGRESSION_MIN_MS = 0.5
+# Gallery size used to compare storage formats (startup time, RSS, accuracy); 0 skips it
+STORAGE_GALLERY_SIZE = 10000
+# "in_memory" is the reference: every float32 embedding read into RAM and compared exactly
+STORAGE_FORMATS = ["in_memory", "float32", "float16", "int8"]
+# Each mapped format is measured with exact search and with the app's default search
+# (IVF index from ANN_MIN_GALLERY_SIZE faces on)
+STORAGE_SEARCH_MODES = {"exact": None, "default": ANN_MIN_GALLERY_SIZE}
+# Fresh interpreters started to time the app's cold start of the log and admin pages
+STARTUP_RUNS = 5
+STARTUP_GALLERY_SIZE = 1000
+STARTUP_LOG_ROWS = 10000
+# Log rows written per transaction while generating a synthetic log
+LOG_CHUNK_SIZE = 50000
+# Worker counts whose pool throughput is measured on --images (0 = the app's default, workers.NUM_WORKERS)
+POOL_WORKER_COUNTS = [1, 2, 0]
+# Check-in requests sent through each pool
+POOL_REQUESTS = 200
+# Frames read from --video for the burst-motion scores
+BURST_MAX_FRAMES = 3000
+BASELINE_FILE = "bench_baseline.json"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+# Function to summarise latencies (seconds) as throughput and p50/p95/p99 in milliseconds.
+# items is the number of frames/rows handled per call, for throughput of batch operations.
+def latency_stats(samples, items=1):
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    total = float(ms.sum()) / 1000.0
+    return {
+        "count": len(samples),
+        "items_per_call": items,
+        "throughput_per_s": len(samples) * items / total if total > 0 else 0.0,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+# Function to time repeated calls of fn(i); setup(i), if given, runs untimed before each call
+def timed(fn, repeats, items=1, setup=None):
+    samples = []
+    for i in range(repeats):
+        if setup is not None:
+            setup(i)
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return latency_stats(samples, items)
+
+
+# Function to make n random unit-length embeddings
+def synthetic_embeddings(rng, n, dim=EMBEDDING_DIM):
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+# Function to make a probe of the same person from a registered embedding
+def noisy_probe(rng, embedding, noise=PROBE_NOISE):
+    scale = noise / np.sqrt(embedding.shape[-1])
+    return embedding + rng.standard_normal(embedding.shape, dtype=np.float32) * scale
+
+
+# Function to benchmark registration, duplicate checking and recognition on a synthetic gallery
+def bench_gallery(workdir, size, rng, dim=EMBEDDING_DIM, repeats=REPEATS, batch_size=BATCH_SIZE):
+    gallery_dir = os.path.join(workdir, f"gallery-{size}")
+    embeddings = synthetic_embeddings(rng, size, dim)
+    names = [f"person-{i:06d}" for i in range(size)]
+
+    started = time.perf_counter()
+    gallery = FaceGallery(gallery_dir)
+    gallery.add_many(names, embeddings)
+    gallery.compact()
+    results = {"build_seconds": time.perf_counter() - started}
+
+    started = time.perf_counter()
+    gallery = FaceGallery(gallery_dir)
+    results["load_seconds"] = time.perf_counter() - started
+    results["uses_ann"] = gallery.snapshot.engine.uses_ann
+
+    targets = rng.integers(0, size, repeats * batch_size)
+    probes = np.stack([noisy_probe(rng, embeddings[t]) for t in targets])
+
+    # Recognition: one probe per call, then micro-batches of batch_size probes
+    results["recognize_single"] = timed(lambda i: gallery.match(probes[i]), repeats)
+    results["recognize_batch"] = timed(
+        lambda i: gallery.match_many(list(probes[i * batch_size:(i + 1) * batch_size])),
+        repeats, items=batch_size
+    )
+    hits = sum(
+        1 for match, target in zip(gallery.match_many(list(probes)), targets)
+        if match is not None and match[0] == names[target]
+    )
+    results["top1_accuracy"] = hits / len(targets)
+
+    # Registration: duplicate check of the enrolment embeddings, then adding the new identity
+    enrolments = [
+        [noisy_probe(rng, e) for e in synthetic_embeddings(rng, 1, dim).repeat(TEMPLATES_PER_IDENTITY, axis=0)]
+        for _ in range(repeats)
+    ]
+    results["duplicate_check"] = timed(lambda i: gallery.find_duplicate(enrolments[i]), repeats)
+    results["register"] = timed(lambda i: gallery.add_identity(f"new-{i:06d}", enrolments[i]), repeats)
+    shutil.rmtree(gallery_dir, ignore_errors=True)
+    return results
+
+
+# Function to get the resident memory of this process in bytes: total, anonymous (private heap)
+# and file-backed (memory-mapped files, shared through the page cache and reclaimable).
+# Values that cannot be read on this platform are None.
+def memory_usage():
+    usage = {"rss": None, "anon": None, "file": None}
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile"):
+                    usage[{"VmRSS": "rss", "RssAnon": "anon", "RssFile": "file"}[key]] = int(value.split()[0]) * 1024
+        return usage
+    except OSError:
+        pass
+    try:
+        import psutil
+        usage["rss"] = psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    return usage
+
+
+# Function to report memory growth since `before` in MB
+def _memory_growth(before):
+    after = memory_usage()
+    return {
+        f"{key}_mb": (after[key] - before[key]) / 2 ** 20 if after[key] is not None and before[key] is not None else None
+        for key in before
+    }
+
+
+# Function run in a fresh process: open a gallery in one storage format, recognise every probe
+# and report startup time (including any IVF index build), memory and the predicted names.
+# ann_min_size=None searches exactly, so accuracy differences come from the storage format alone.
+def _measure_storage(gallery_dir, storage, probes_path, repeats, ann_min_size=None):
+    probes = np.load(probes_path)
+    memory_start = memory_usage()
+    started = time.perf_counter()
+    if storage == "in_memory":
+        with open(os.path.join(gallery_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        embeddings = np.fromfile(
+            os.path.join(gallery_dir, f"embeddings-{manifest['generation']}.f32"), dtype=np.float32
+        ).reshape(manifest["count"], manifest["dim"])
+        with open(os.path.join(gallery_dir, f"names-{manifest['generation']}.jsonl"), "rb") as f:
+            names = [json.loads(line) for line in f.read().splitlines()]
+        engine = MatchEngine(embeddings, names, ann_min_size=None)
+        match_many = lambda batch: engine.best_matches(batch, COSINE_THRESHOLD)
+        match = lambda probe: engine.best_match(probe, COSINE_THRESHOLD)
+    else:
+        gallery = FaceGallery(gallery_dir, ann_min_size=ann_min_size, storage=storage)
+        match_many, match = gallery.match_many, gallery.match
+    startup = time.perf_counter() - started
+    uses_ann = storage != "in_memory" and gallery.snapshot.engine.uses_ann
+    memory_loaded = _memory_growth(memory_start)
+    predictions = []
+    for start in range(0, len(probes), BATCH_SIZE):
+        predictions.extend(m[0] if m else None for m in match_many(list(probes[start:start + BATCH_SIZE])))
+    return {
+        "uses_ann": uses_ann,
+        "startup_seconds": startup,
+        "memory_loaded": memory_loaded,
+        "memory_after_search": _memory_growth(memory_start),
+        "recognize_single": timed(lambda i: match(probes[i % len(probes)]), repeats),
+        "predictions": predictions,
+    }
+
+
+# Function to compare storage formats on one synthetic gallery. Each format and search mode is
+# measured in a fresh process so startup time and RSS are not skewed by earlier runs; accuracy is
+# top-1 identification of noisy probes, and agreement is with the in-memory float32 reference.
+def bench_storage(workdir, size, rng, dim=EMBEDDING_DIM, repeats=REPEATS, formats=STORAGE_FORMATS,
+                  search_modes=STORAGE_SEARCH_MODES):
+    embeddings = synthetic_embeddings(rng, size, dim)
+    names = [f"person-{i:06d}" for i in range(size)]
+    targets = rng.integers(0, size, max(repeats, 500))
+    probes = np.stack([noisy_probe(rng, embeddings[t]) for t in targets])
+    probes_path = os.path.join(workdir, "probes.npy")
+    np.save(probes_path, probes)
+
+    source_dir = os.path.join(workdir, f"storage-{size}")
+    gallery = FaceGallery(source_dir, ann_min_size=None)
+    gallery.add_many(names, embeddings)
+    del gallery, embeddings
+
+    results = {}
+    reference = None
+    context = multiprocessing.get_context("spawn")
+    for storage in formats:
+        gallery_dir = source_dir
+        if storage != "in_memory":
+            gallery_dir = os.path.join(workdir, f"storage-{size}-{storage}")
+            shutil.copytree(source_dir, gallery_dir)
+            # Opening in another format converts the files once (not part of the measured startup)
+            FaceGallery(gallery_dir, ann_min_size=None, storage=storage)
+        disk_mb = sum(
+            os.path.getsize(os.path.join(gallery_dir, file)) for file in os.listdir(gallery_dir)
+            if os.path.isfile(os.path.join(gallery_dir, file))
+        ) / 2 ** 20
+        modes = {"exact": None} if storage == "in_memory" else search_modes
+        results[storage] = {}
+        for mode, ann_min_size in modes.items():
+            with context.Pool(1) as pool:
+                measured = pool.apply(_measure_storage, (gallery_dir, storage, probes_path, repeats, ann_min_size))
+            predictions = measured.pop("predictions")
+            if reference is None:
+                reference = predictions
+            measured["top1_accuracy"] = float(np.mean([p == names[t] for p, t in zip(predictions, targets)]))
+            measured["agreement_with_reference"] = float(np.mean([p == r for p, r in zip(predictions, reference)]))
+            measured["disk_mb"] = disk_mb
+            results[storage][mode] = measured
+        if gallery_dir != source_dir:
+            shutil.rmtree(gallery_dir, ignore_errors=True)
+    shutil.rmtree(source_dir, ignore_errors=True)
+    return results
+
+
+# Run in a fresh interpreter: import what app.py imports (except Streamlit), open the store and the
+# gallery, prepare the History and Manage Users data, and print each phase's duration as JSON
+_STARTUP_SCRIPT = '''
+import sys, time, json
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import pandas, PIL.Image
+import analytics, metrics, workers, quality, cache
+from attendance_store import AttendanceStore
+from gallery import FaceGallery
+phases = {"imports": time.perf_counter() - started}
+mark = time.perf_counter()
+store = AttendanceStore(sys.argv[2])
+phases["store"] = time.perf_counter() - mark
+mark = time.perf_counter()
+gallery = FaceGallery(sys.argv[3])
+phases["gallery"] = time.perf_counter() - mark
+mark = time.perf_counter()
+analytics.get_summary(store)
+analytics.get_daily_stats(store)
+analytics.get_page(store)
+phases["history_page"] = time.perf_counter() - mark
+mark = time.perf_counter()
+analytics.get_attendance_counts(store)
+len(gallery)
+phases["manage_page"] = time.perf_counter() - mark
+phases["total"] = time.perf_counter() - started
+loaded = sorted(name for name in ("deepface", "tensorflow", "torch") if name in sys.modules)
+print(json.dumps({"phases": phases, "recognition_stack_imported": loaded}))
+'''
+
+
+# Function to time a cold start of the log and admin pages in fresh interpreters (no face model
+# should be imported for them); reports each phase's latency over the runs
+def bench_startup(workdir, rng, runs=STARTUP_RUNS, gallery_size=STARTUP_GALLERY_SIZE, log_rows=STARTUP_LOG_ROWS, dim=EMBEDDING_DIM):
+    gallery_dir = os.path.join(workdir, "startup-gallery")
+    FaceGallery(gallery_dir, ann_min_size=None).add_many(
+        [f"person-{i:06d}" for i in range(gallery_size)], synthetic_embeddings(rng, gallery_size, dim)
+    )
+    db_path = os.path.join(workdir, "startup.db")
+    build_log(AttendanceStore(db_path), log_rows)
+    samples = {}
+    imported = set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _STARTUP_SCRIPT, os.path.dirname(os.path.abspath(__file__)), db_path, gallery_dir],
+            capture_output=True, text=True, check=True, cwd=workdir
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        for phase, seconds in report["phases"].items():
+            samples.setdefault(phase, []).append(seconds)
+        imported.update(report["recognition_stack_imported"])
+    results = {phase: latency_stats(values) for phase, values in samples.items()}
+    results["recognition_stack_imported"] = sorted(imported)
+    return results
+
+
+# Function to fill a store with a synthetic log of about `rows` 'Present' records (one per user per day)
+def build_log(store, rows, users=None):
+    users = users or max(1, min(1000, rows // 100))
+    days = (rows + users - 1) // users
+    first_day = date(2000, 1, 1)
+    names = [f"Person {i:05d}" for i in range(users)]
+    entries = []
+    written = 0
+    for day in range(days):
+        date_str = (first_day + timedelta(days=day)).strftime("%Y-%m-%d")
+        for user in range(users):
+            if written + len(entries) >= rows:
+                break
+            entries.append((names[user], date_str, f"{8 + user % 10:02d}:{user % 60:02d}:00"))
+        if len(entries) >= LOG_CHUNK_SIZE or day == days - 1:
+            store.mark_present_many(entries)
+            written += len(entries)
+            entries = []
+    return names
+
+
+# Function to benchmark attendance appends and the data prep of the history and manage pages
+def bench_attendance(workdir, rows, repeats=REPEATS):
+    db_path = os.path.join(workdir, f"attendance-{rows}.db")
+    store = AttendanceStore(db_path)
+    started = time.perf_counter()
+    names = build_log(store, rows)
+    results = {"build_seconds": time.perf_counter() - started, "rows": store.count()}
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    results["append"] = timed(lambda i: store.mark_present(f"Visitor {i:06d}", today, "12:00:00"), repeats)
+
+    def history_page(i):
+        analytics.get_summary(store)
+        analytics.get_daily_stats(store)
+        analytics.get_user_stats(store)
+        analytics.count_records(store)
+        analytics.get_page(store, 1)
+
+    # "cold" pages follow a write, so nothing is served from the analytics cache
+    new_record = lambda i: store.mark_present(f"Cold {i:06d}", today, "12:00:00")
+    results["history_page_cold"] = timed(history_page, repeats, setup=new_record)
+    results["history_page_warm"] = timed(history_page, repeats)
+    results["history_filtered_page"] = timed(
+        lambda i: analytics.get_page(store, 1 + i % 5, names=[names[i % len(names)]]),
+        repeats, setup=lambda i: store.mark_present(f"Filter {i:06d}", today, "12:00:00")
+    )
+    results["manage_page_cold"] = timed(
+        lambda i: analytics.get_attendance_counts(store), repeats,
+        setup=lambda i: store.mark_present(f"Manage {i:06d}", today, "12:00:00")
+    )
+    with tempfile.TemporaryFile(dir=workdir) as f:
+        results["export_csv"] = timed(lambda i: analytics.export_csv(store, f), 1, items=results["rows"])
+    return results
+
+
+# Function to benchmark detection and embedding on real face images (needs the model weights locally)
+def bench_images(image_dir, repeats=REPEATS, batch_size=BATCH_SIZE):
+    import cv2
+    from detection import detect_largest_face, crop_face
+    from gallery import compute_embedding, compute_embeddings
+    from models import warm_up
+    from quality import score_face
+    from liveness import check_capture, moire_score, MOIRE_PEAK_RATIO
+
+    paths = [os.path.join(image_dir, f) for f in sorted(os.listdir(image_dir)) if f.lower().endswith(IMAGE_EXTENSIONS)]
+    frames = [frame for frame in (cv2.imread(path) for path in paths) if frame is not None]
+    if not frames:
+        return {"error": f"No readable images in {image_dir}"}
+    boxes = [detect_largest_face(frame) for frame in frames]
+    crops = [crop_face(frame, box) for frame, box in zip(frames, boxes) if box is not None]
+    if not crops:
+        return {"error": f"No faces found in {image_dir}"}
+
+    started = time.perf_counter()
+    warm_up()
+    results = {"images": len(frames), "faces": len(crops), "warm_up_seconds": time.perf_counter() - started}
+    results["detect"] = timed(lambda i: detect_largest_face(frames[i % len(frames)]), repeats)
+    # Liveness pre-filter cost, and what it rejects among these (presumably live) photos
+    faces = [(frame, box, score_face(frame, box)) for frame, box in zip(frames, boxes) if box is not None]
+    rejections = [check_capture(*face) for face in faces]
+    results["liveness_rejections"] = {reason: rejections.count(reason) for reason in sorted(set(filter(None, rejections)))}
+    results["liveness"] = timed(lambda i: check_capture(*faces[i % len(faces)]), repeats)
+    # Moiré scores of these live faces, to calibrate MOIRE_PEAK_RATIO before turning on MOIRE_CHECK
+    scores = np.array([
+        moire_score(cv2.cvtColor(frame[max(0, y):y + h, max(0, x):x + w], cv2.COLOR_BGR2GRAY))
+        for frame, (x, y, w, h), _ in faces
+    ])
+    results["moire_scores"] = {
+        "p50": float(np.percentile(scores, 50)),
+        "p99": float(np.percentile(scores, 99)),
+        "max": float(scores.max()),
+        "above_threshold": int((scores > MOIRE_PEAK_RATIO).sum()),
+    }
+    results["embed_single"] = timed(lambda i: compute_embedding(crops[i % len(crops)]), repeats)
+    batch = [crops[i % len(crops)] for i in range(batch_size)]
+    results["embed_batch"] = timed(lambda i: compute_embeddings(batch), max(1, repeats // batch_size), items=batch_size)
+    return results
+
+
+# Function to measure check-in throughput of the worker pool with several worker counts. Every
+# request goes through the queue, micro-batching and the worker processes like a check-in does
+# (submitted directly, so the probe cache never answers); at most a queue's worth is in flight.
+def bench_pool(image_dir, worker_counts=POOL_WORKER_COUNTS, requests=POOL_REQUESTS):
+    from workers import InferencePool, NUM_WORKERS, MAX_QUEUE_SIZE
+
+    photos = []
+    for file in sorted(os.listdir(image_dir)):
+        if file.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(image_dir, file), "rb") as f:
+                photos.append(f.read())
+    if not photos:
+        return {"error": f"No readable images in {image_dir}"}
+    results = {}
+    for workers in sorted({count or NUM_WORKERS for count in worker_counts}):
+        started = time.perf_counter()
+        pool = InferencePool(num_workers=workers)
+        try:
+            while not pool.ready.wait(0.1):
+                if pool.health()["status"] == "failed":
+                    raise RuntimeError(pool.health()["warmup_error"])
+            warm_up = time.perf_counter() - started
+            latencies = []
+            started = time.perf_counter()
+            for start in range(0, requests, MAX_QUEUE_SIZE):
+                submitted = []
+                for i in range(start, min(start + MAX_QUEUE_SIZE, requests)):
+                    submitted.append((time.perf_counter(), pool.submit(photos[i % len(photos)])))
+                for queued, future in submitted:
+                    future.result()
+                    latencies.append(time.perf_counter() - queued)
+            elapsed = time.perf_counter() - started
+        finally:
+            pool.shutdown()
+        stats = latency_stats(latencies)
+        # Requests overlap, so throughput is measured over the whole run rather than summed latencies
+        stats["throughput_per_s"] = requests / elapsed
+        stats["threads_per_worker"] = pool.threads
+        stats["warm_up_seconds"] = warm_up
+        results[str(workers)] = stats
+    return results
+
+
+# Function to score liveness bursts on a recording of live people (e.g. from the kiosk camera), to
+# calibrate MIN_BURST_MOTION: like stream.recognize_stream, the face found when a burst starts is
+# sampled at that fixed box on BURST_FRAMES consecutive frames
+def bench_burst(video_path, max_frames=BURST_MAX_FRAMES):
+    from detection import detect_largest_face
+    from liveness import BURST_FRAMES, MIN_BURST_MOTION, burst_sample, burst_motion
+    from stream import read_frames
+
+    scores = []
+    samples = []
+    box = None
+    frames = 0
+    started = time.perf_counter()
+    for index, frame in read_frames(video_path):
+        if index >= max_frames:
+            break
+        frames += 1
+        if box is None:
+            box = detect_largest_face(frame)
+            if box is None:
+                continue
+        samples.append(burst_sample(frame, box))
+        if len(samples) >= BURST_FRAMES:
+            scores.append(burst_motion(samples))
+            samples = []
+            box = None
+    if not scores:
+        return {"error": f"No faces found in {video_path}"}
+    scores = np.array(scores)
+    return {
+        "frames": frames,
+        "bursts": len(scores),
+        "seconds": time.perf_counter() - started,
+        "burst_motion": {
+            "min": float(scores.min()),
+            "p1": float(np.percentile(scores, 1)),
+            "p5": float(np.percentile(scores, 5)),
+            "p50": float(np.percentile(scores, 50)),
+            "below_threshold": int((scores < MIN_BURST_MOTION).sum()),
+        },
+    }
+
+
+# Function to list the timed operations as {"group/.../operation": stats}
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, dict) and "p95_ms" in value:
+            flat[path] = value
+        elif isinstance(value, dict):
+            flat.update(flatten(value, path))
+    return flat
+
+
+# Function to compare a run with a baseline; returns the operations whose p50 or p95
+# got slower than the baseline by more than the tolerance (and by at least min_ms)
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE, min_ms=REGRESSION_MIN_MS):
+    current = flatten(results["results"])
+    previous = flatten(baseline["results"])
+    regressions = []
+    for path, stats in current.items():
+        old = previous.get(path)
+        if old is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            slower = stats[metric] - old[metric]
+            if old[metric] > 0 and stats[metric] > old[metric] * (1 + tolerance) and slower >= min_ms:
+                regressions.append({
+                    "operation": path,
+                    "metric": metric,
+                    "baseline": old[metric],
+                    "current": stats[metric],
+                    "ratio": stats[metric] / old[metric],
+                })
+    return regressions
+
+
+def run(gallery_sizes=GALLERY_SIZES, log_sizes=LOG_SIZES, dim=EMBEDDING_DIM, repeats=REPEATS,
+        image_dir=None, workdir=None, seed=0, storage_size=STORAGE_GALLERY_SIZE,
+        startup_runs=STARTUP_RUNS, pool_workers=POOL_WORKER_COUNTS, video=None):
+    rng = np.random.default_rng(seed)
+    results = {"gallery": {}, "attendance": {}}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for size in gallery_sizes:
+            results["gallery"][str(size)] = bench_gallery(tmp, size, rng, dim, repeats)
+        if storage_size:
+            results["storage"] = {str(storage_size): bench_storage(tmp, storage_size, rng, dim, repeats)}
+        for rows in log_sizes:
+            results["attendance"][str(rows)] = bench_attendance(tmp, rows, repeats)
+        if startup_runs:
+            results["startup"] = bench_startup(tmp, rng, startup_runs, dim=dim)
+    if image_dir:
+        try:
+            results["images"] = bench_images(image_dir, repeats)
+        except Exception as e:
+            results["images"] = {"error": str(e)}
+        if pool_workers:
+            try:
+                results["pool"] = bench_pool(image_dir, pool_workers)
+            except Exception as e:
+                results["pool"] = {"error": str(e)}
+    if video:
+        try:
+            results["burst"] = bench_burst(video)
+        except Exception as e:
+            results["burst"] = {"error": str(e)}
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "dim": dim,
+            "repeats": repeats,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark recognition and attendance storage on synthetic data (offline, CPU)")
+    parser.add_argument("--gallery-sizes", type=_int_list, default=GALLERY_SIZES, help="Comma-separated gallery sizes")
+    parser.add_argument("--log-sizes", type=_int_list, default=LOG_SIZES, help="Comma-separated attendance log sizes")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="Embedding size of the synthetic galleries")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="Timed calls per operation")
+    parser.add_argument("--storage-size", type=int, default=STORAGE_GALLERY_SIZE, help="Gallery size for the storage format comparison (0 to skip)")
+    parser.add_argument("--startup-runs", type=int, default=STARTUP_RUNS, help="Fresh interpreters started to time a cold start (0 to skip)")
+    parser.add_argument("--images", help="Folder of real face images for detection/embedding timings")
+    parser.add_argument("--pool-workers", type=_int_list, default=POOL_WORKER_COUNTS, help="Comma-separated worker counts for the pool throughput run on --images (0 = default count; empty to skip)")
+    parser.add_argument("--video", help="Recording of live people from the kiosk camera, for burst-motion scores")
+    parser.add_argument("--workdir", help="Where temporary galleries and databases are created")
+    parser.add_argument("--output", help="Write the results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help=f"Compare with this results file (e.g. {BASELINE_FILE}); exit code 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="Allowed slowdown before a regression is reported")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.gallery_sizes, args.log_sizes, args.dim, args.repeats, args.images, args.workdir,
+        storage_size=args.storage_size, startup_runs=args.startup_runs, pool_workers=args.pool_workers,
+        video=args.video
+    )
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.save_baseline:
+        with open(args.baseline or BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['operation']} {regression['metric']}: "
+            f"{regression['baseline']:.2f} ms -> {regression['current']:.2f} ms",
+            file=sys.stderr
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
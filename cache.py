@@ -0,0 +1,74 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Probe results kept per server process, and for how long (seconds)
+PROBE_CACHE_SIZE = 256
+PROBE_CACHE_TTL = 300
+
+
+# Function to compute a content hash of a frame (encoded image bytes or a decoded array)
+def frame_key(item):
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(item, np.ndarray):
+        digest.update(str((item.shape, item.dtype.str)).encode("ascii"))
+        digest.update(np.ascontiguousarray(item).data)
+    else:
+        digest.update(item)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    # Size-bounded, thread-safe LRU cache whose entries also expire after ttl seconds
+    def __init__(self, maxsize=PROBE_CACHE_SIZE, ttl=PROBE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    # Returns (True, value) on a hit and (False, None) on a miss
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (self.ttl is None or now - entry[0] <= self.ttl):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._data[key]
+                self.evictions += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,70 @@
+import threading
+import cv2
+import numpy as np
+from models import get_face_detector
+from metrics import stage
+
+# Frames are shrunk to this width before running the cascade (boxes are scaled back)
+DETECT_MAX_WIDTH = 480
+SCALE_FACTOR = 1.1
+MIN_NEIGHBORS = 5
+# Smallest face searched for, in pixels of the downscaled frame
+MIN_FACE_SIZE = (40, 40)
+# Extra border kept around the detected box when cropping, as a fraction of the box size
+CROP_MARGIN = 0.15
+
+# OpenCV cascades are not guaranteed to be thread-safe and the shared one is used by every session
+_detect_lock = threading.Lock()
+
+
+# Function to detect all faces in a BGR frame, largest first, as (x, y, w, h) in original pixels
+def detect_faces(img, max_width=DETECT_MAX_WIDTH, scale_factor=SCALE_FACTOR,
+                 min_neighbors=MIN_NEIGHBORS, min_size=MIN_FACE_SIZE):
+    with stage("detect"):
+        if img is None or img.size == 0:
+            return []
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        height, width = gray.shape[:2]
+        scale = 1.0
+        if width > max_width:
+            scale = max_width / width
+            gray = cv2.resize(gray, (max_width, int(round(height * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.equalizeHist(gray)
+
+        cascade = get_face_detector()
+        with _detect_lock:
+            boxes = cascade.detectMultiScale(
+                gray,
+                scaleFactor=scale_factor,
+                minNeighbors=min_neighbors,
+                minSize=min_size
+            )
+        faces = []
+        for (x, y, w, h) in boxes:
+            faces.append((int(x / scale), int(y / scale), int(w / scale), int(h / scale)))
+        faces.sort(key=lambda box: box[2] * box[3], reverse=True)
+        return faces
+
+
+# Function to detect the largest face in a frame (None if there is no face)
+def detect_largest_face(img, **kwargs):
+    faces = detect_faces(img, **kwargs)
+    return faces[0] if faces else None
+
+
+# Function to crop a detected face (with a small margin) from the full-resolution frame
+def crop_face(img, box, margin=CROP_MARGIN):
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    height, width = img.shape[:2]
+    x1, y1 = max(0, x - dx), max(0, y - dy)
+    x2, y2 = min(width, x + w + dx), min(height, y + h + dy)
+    return img[y1:y2, x1:x2]
+
+
+# Function to decode encoded image bytes (e.g. from st.camera_input) straight into a BGR array
+def decode_image(data):
+    if not data:
+        return None
+    with stage("decode"):
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import cv2
+import numpy as np
+from detection import detect_largest_face, crop_face
+from gallery import (
+    get_gallery, compute_embeddings, identity_centroid, l2_normalize,
+    DUPLICATE_THRESHOLD, TEMPLATES_PER_IDENTITY
+)
+from quality import score_face, select_best
+from attendance_store import normalize_name
+
+# Folder the app keeps one photo per registered user in
+TRAIN_DIR = "registered_faces"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+# Faces embedded per model call
+EMBED_BATCH_SIZE = 32
+# Rows of the pairwise distance matrix computed at once (bounds memory for very large batches)
+PAIRWISE_CHUNK_SIZE = 2048
+
+
+# Function to find the people in an enrolment folder: either one image per person
+# (<folder>/<Name>.jpg) or one sub-folder of images per person (<folder>/<Name>/*.jpg).
+# Returns [(name, [image paths])] sorted by name.
+def collect_people(folder):
+    people = []
+    for entry in sorted(os.listdir(folder)):
+        path = os.path.join(folder, entry)
+        if os.path.isdir(path):
+            images = [
+                os.path.join(path, file) for file in sorted(os.listdir(path))
+                if file.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+            if images:
+                people.append((entry, images))
+        elif entry.lower().endswith(IMAGE_EXTENSIONS):
+            people.append((os.path.splitext(entry)[0], [path]))
+    return people
+
+
+# Function to detect, quality-score and embed every image of every person (batched model calls).
+# Returns one dict per person with the embeddings of their best images, or a "rejected" reason.
+def embed_people(people, batch_size=EMBED_BATCH_SIZE):
+    candidates = []
+    crops = []
+    owners = []
+    for name, paths in people:
+        person = {"name": name, "paths": [], "qualities": [], "embeddings": []}
+        unreadable = 0
+        for path in paths:
+            frame = cv2.imread(path)
+            if frame is None:
+                unreadable += 1
+                continue
+            box = detect_largest_face(frame)
+            if box is None:
+                continue
+            person["paths"].append(path)
+            person["qualities"].append(score_face(frame, box))
+            crops.append(crop_face(frame, box))
+            owners.append(person)
+        if unreadable == len(paths):
+            person["rejected"] = "unreadable"
+        elif not person["paths"]:
+            person["rejected"] = "no_face"
+        candidates.append(person)
+
+    for start in range(0, len(crops), batch_size):
+        for owner, embedding in zip(owners[start:start + batch_size], compute_embeddings(crops[start:start + batch_size])):
+            owner["embeddings"].append(embedding)
+
+    for person in candidates:
+        if "rejected" in person:
+            continue
+        best = [
+            i for i in select_best(person["qualities"], TEMPLATES_PER_IDENTITY)
+            if person["embeddings"][i] is not None
+        ]
+        if not best:
+            person["rejected"] = "low_quality"
+            continue
+        person["best_path"] = person["paths"][best[0]]
+        person["embeddings"] = [person["embeddings"][i] for i in best]
+    return candidates
+
+
+# Function to find duplicates inside a batch with one pairwise-distance computation between
+# the people's centroids. People are kept in order; a later person closer than threshold to an
+# earlier kept one is a duplicate of it. Returns {index: (index of the kept person, distance)}.
+def find_batch_duplicates(centroids, threshold=DUPLICATE_THRESHOLD, skip=(), chunk_size=PAIRWISE_CHUNK_SIZE):
+    centroids = l2_normalize(centroids)
+    count = len(centroids)
+    close = [[] for _ in range(count)]
+    for start in range(0, count, chunk_size):
+        distances = 1.0 - centroids[start:start + chunk_size] @ centroids.T
+        rows, cols = np.nonzero(distances <= threshold)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            i = start + row
+            if col > i:
+                close[i].append((col, float(distances[row, col])))
+    duplicates = {}
+    skip = set(skip)
+    for i in range(count):
+        if i in skip or i in duplicates:
+            continue
+        for j, distance in close[i]:
+            if j not in skip and j not in duplicates:
+                duplicates[j] = (i, distance)
+    return duplicates
+
+
+# Function to save a person's photo in the registered folder the way the app does (<Name>.jpg)
+def save_photo(path, name, train_dir=TRAIN_DIR):
+    os.makedirs(train_dir, exist_ok=True)
+    target = os.path.join(train_dir, f"{name}.jpg")
+    if path.lower().endswith((".jpg", ".jpeg")):
+        shutil.copyfile(path, target)
+    else:
+        cv2.imwrite(target, cv2.imread(path))
+    return target
+
+
+# Function to enrol a whole folder of new people. Each person is checked against the gallery
+# (one batched top-1 query) and against everyone else in the batch (one pairwise computation);
+# duplicates, taken names and unusable photos are skipped and reported.
+def enrol_folder(folder, gallery=None, train_dir=TRAIN_DIR, threshold=DUPLICATE_THRESHOLD, dry_run=False):
+    if gallery is None:
+        gallery = get_gallery()
+    summary = {
+        "people": 0, "enrolled": [], "duplicate_of_registered": [], "duplicate_in_batch": [],
+        "name_taken": [], "no_face": [], "low_quality": [], "unreadable": [],
+    }
+    people = collect_people(folder)
+    summary["people"] = len(people)
+
+    # Names are unique case-insensitively, against registered users and within the batch
+    taken = {normalize_name(os.path.splitext(file)[0]) for file in os.listdir(train_dir)} if os.path.isdir(train_dir) else set()
+    taken |= {normalize_name(name) for name in gallery.names}
+    unique_people = []
+    for name, paths in people:
+        key = normalize_name(name)
+        if key in taken:
+            summary["name_taken"].append(name)
+        else:
+            taken.add(key)
+            unique_people.append((name, paths))
+
+    candidates = []
+    for person in embed_people(unique_people):
+        if "rejected" in person:
+            summary[person["rejected"]].append(person["name"])
+        else:
+            candidates.append(person)
+    if not candidates:
+        return summary
+
+    centroids = np.stack([identity_centroid(person["embeddings"]) for person in candidates])
+    registered_matches = gallery.match_many(list(centroids), threshold)
+    rejected = set()
+    for i, match in enumerate(registered_matches):
+        if match:
+            rejected.add(i)
+            summary["duplicate_of_registered"].append(
+                {"name": candidates[i]["name"], "registered_as": match[0], "distance": match[1]}
+            )
+    for j, (i, distance) in sorted(find_batch_duplicates(centroids, threshold, skip=rejected).items()):
+        rejected.add(j)
+        summary["duplicate_in_batch"].append(
+            {"name": candidates[j]["name"], "same_as": candidates[i]["name"], "distance": distance}
+        )
+
+    accepted = [person for i, person in enumerate(candidates) if i not in rejected]
+    if accepted and not dry_run:
+        gallery.add_identities([p["name"] for p in accepted], [p["embeddings"] for p in accepted])
+        for person in accepted:
+            save_photo(person["best_path"], person["name"], train_dir)
+    summary["enrolled"] = [
+        {"name": person["name"], "templates": len(person["embeddings"])} for person in accepted
+    ]
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrol many people at once, skipping duplicate faces")
+    parser.add_argument("folder", help="Folder with <Name>.jpg files and/or <Name>/ sub-folders of photos")
+    parser.add_argument("--train-dir", default=TRAIN_DIR, help="Folder of registered photos used by the app")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD, help="Cosine distance below which two faces are the same person")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be enrolled")
+    args = parser.parse_args(argv)
+
+    summary = enrol_folder(args.folder, train_dir=args.train_dir, threshold=args.threshold, dry_run=args.dry_run)
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,754 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import cv2
+import numpy as np
+from matching import MatchEngine, QuantizedMatrix, quantize, ANN_MIN_GALLERY_SIZE
+from models import MODEL_NAME, DETECTOR_BACKEND, get_deepface, get_recognition_model
+import metrics
+from metrics import stage
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# Folder holding the precomputed face embeddings
+GALLERY_DIR = "gallery"
+MANIFEST_FILE = "manifest.json"
+# Held (as an OS file lock) by whichever process is writing the gallery: the app, enrol.py, ...
+LOCK_FILE = "gallery.lock"
+# Rebuild the IVF index once rows added after it was built exceed this fraction of it
+REINDEX_FRACTION = 0.1
+# Format searched at recognition time: "float32", or "float16" / "int8" (per-row scale) for
+# low-memory machines. Full-precision rows are always kept on disk to re-rank candidates.
+GALLERY_STORAGE = "float32"
+CODE_DTYPES = {"float16": np.float16, "int8": np.int8}
+# Rows copied at once when a new generation of the files is written
+REWRITE_CHUNK_ROWS = 8192
+
+# Same cosine threshold DeepFace.verify uses for VGG-Face
+COSINE_THRESHOLD = 0.68
+# Registration is refused when the new face is at least this close to a registered person
+DUPLICATE_THRESHOLD = COSINE_THRESHOLD
+# Faces are resized to the VGG-Face input size so a batch can be stacked into one array
+BATCH_FACE_SIZE = (224, 224)
+# Best enrolment frames kept per person
+TEMPLATES_PER_IDENTITY = 5
+# Closest centroids re-ranked with the per-person templates
+RERANK_CANDIDATES = 5
+# Identities whose templates are kept in memory for re-ranking
+TEMPLATE_CACHE_SIZE = 1024
+# Registered photos sent to the embedding workers at once by sync_with_folder
+SYNC_BATCH_SIZE = 16
+
+
+# Function to compute the VGG-Face embedding of an already cropped face (BGR array)
+def compute_embedding(face_img):
+    # Make sure the shared model is built (only once per process) before DeepFace uses it
+    get_recognition_model()
+    with stage("embed"):
+        return _represent(face_img)
+
+
+def _represent(face_img):
+    result = get_deepface().represent(
+        face_img,
+        model_name=MODEL_NAME,
+        detector_backend=DETECTOR_BACKEND,
+        enforce_detection=False
+    )
+    if not result:
+        return None
+    return np.asarray(result[0]["embedding"], dtype=np.float32)
+
+
+# Function to embed several cropped faces with one batched model call.
+# Falls back to one call per face on deepface versions without batch support.
+def compute_embeddings(face_imgs):
+    if len(face_imgs) == 0:
+        return []
+    get_recognition_model()
+    with stage("embed"):
+        batch = np.stack([cv2.resize(face, BATCH_FACE_SIZE, interpolation=cv2.INTER_AREA) for face in face_imgs])
+        try:
+            results = get_deepface().represent(
+                batch,
+                model_name=MODEL_NAME,
+                detector_backend=DETECTOR_BACKEND,
+                enforce_detection=False
+            )
+            if len(results) == len(face_imgs) and all(isinstance(r, list) for r in results):
+                return [np.asarray(r[0]["embedding"], dtype=np.float32) if r else None for r in results]
+        except Exception:
+            pass
+        return [_represent(face) for face in batch]
+
+
+# Function to scale embeddings to unit length so cosine distance is 1 - dot product
+def l2_normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# Function to combine a person's enrolment embeddings into the one vector stored for search
+def identity_centroid(embeddings):
+    return l2_normalize(l2_normalize(np.stack(embeddings)).mean(axis=0))
+
+
+class TemplateStore:
+    # Per-identity template embeddings, one small .npy file per person (written atomically).
+    # Only the top candidates of a search are re-ranked, so files are loaded lazily into an LRU cache.
+    def __init__(self, templates_dir, cache_size=TEMPLATE_CACHE_SIZE):
+        self.templates_dir = templates_dir
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+        return os.path.join(self.templates_dir, f"{digest}.npy")
+
+    def _remember(self, name, templates):
+        with self._lock:
+            self._cache[name] = templates
+            self._cache.move_to_end(name)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # Templates of a person as a (n, dim) matrix of unit-length rows, or None if there are none
+    def get(self, name):
+        with self._lock:
+            if name in self._cache:
+                self._cache.move_to_end(name)
+                return self._cache[name]
+        try:
+            templates = np.load(self._path(name))
+        except Exception:
+            templates = None
+        self._remember(name, templates)
+        return templates
+
+    def put(self, name, templates):
+        os.makedirs(self.templates_dir, exist_ok=True)
+        path = self._path(name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, templates.astype(np.float32))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._remember(name, templates)
+
+    def delete(self, name):
+        path = self._path(name)
+        if os.path.exists(path):
+            os.remove(path)
+        with self._lock:
+            self._cache.pop(name, None)
+
+    # Forget every cached template (another process may have changed the files)
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+class GalleryLoadError(Exception):
+    pass
+
+
+class GallerySnapshot:
+    # Immutable view of the gallery at one version. Searches only ever use a snapshot,
+    # so a concurrent registration or deletion can never be seen half-applied.
+    def __init__(self, version, engine, size):
+        self.version = version
+        self.engine = engine
+        self.size = size
+
+
+class FaceGallery:
+    # Embeddings (one unit-length float32 row per registered face) and names are kept in
+    # append-only files. manifest.json, replaced atomically after every change, records the
+    # version, how many rows are committed and which rows are deleted (tombstones).
+    # Registration appends one row; deletion only adds a tombstone, and a background
+    # compaction rewrites the files without deleted rows and rebuilds the search index.
+    # Several processes may open the same gallery: writers hold LOCK_FILE and first catch up
+    # with the manifest, and searches pick up changes committed by other processes.
+    def __init__(self, gallery_dir=GALLERY_DIR, ann_min_size=ANN_MIN_GALLERY_SIZE, storage=GALLERY_STORAGE):
+        if storage != "float32" and storage not in CODE_DTYPES:
+            raise ValueError(f"Unknown gallery storage: {storage}")
+        self.gallery_dir = gallery_dir
+        self.ann_min_size = ann_min_size
+        self.storage = storage
+        self.manifest_file = os.path.join(gallery_dir, MANIFEST_FILE)
+        self.lock_file = os.path.join(gallery_dir, LOCK_FILE)
+        # Serializes writers in this process (other processes are kept out by LOCK_FILE);
+        # readers never wait for it
+        self.lock = threading.Lock()
+        # Modification time of the manifest this process last read or wrote
+        self._manifest_stamp = None
+        self._compact_lock = threading.Lock()
+        self._compact_thread = None
+        self._compact_requested = False
+        self.templates = TemplateStore(os.path.join(gallery_dir, "templates"))
+        # Registered photos without a usable face, by file name: modification time when it failed
+        self._sync_failed = {}
+        self.load()
+
+    def __len__(self):
+        self.refresh()
+        return self.snapshot.size
+
+    def __contains__(self, name):
+        self.refresh()
+        return name in self._rows
+
+    # Names of the registered (not deleted) faces
+    @property
+    def names(self):
+        self.refresh()
+        return list(self._rows)
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    def _data_path(self, generation):
+        return os.path.join(self.gallery_dir, f"embeddings-{generation}.f32")
+
+    def _names_path(self, generation):
+        return os.path.join(self.gallery_dir, f"names-{generation}.jsonl")
+
+    def _codes_path(self, generation):
+        suffix = "f16" if self.storage == "float16" else "i8"
+        return os.path.join(self.gallery_dir, f"codes-{generation}.{suffix}")
+
+    def _scales_path(self, generation):
+        return os.path.join(self.gallery_dir, f"scales-{generation}.f32")
+
+    # Data files of one generation: full-precision rows, names and (if quantized) codes and scales
+    def _generation_files(self, generation):
+        paths = [self._data_path(generation), self._names_path(generation)]
+        if self.storage in CODE_DTYPES:
+            paths.append(self._codes_path(generation))
+        if self.storage == "int8":
+            paths.append(self._scales_path(generation))
+        return paths
+
+    def _reset(self, generation=0, version=0, dim=None, count=0, names=None, deleted=()):
+        capacity = max(16, count * 2)
+        self._generation = generation
+        self._version = version
+        self._dim = dim
+        self._count = count
+        self._names = list(names or [])
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._valid[:count] = True
+        self._deleted = list(deleted)
+        self._valid[self._deleted] = False
+        self._rows = {self._names[row]: row for row in range(count) if self._valid[row]}
+        self._data_bytes = count * (dim or 0) * 4
+        self._names_bytes = sum(len(self._encode_name(name)) for name in self._names)
+
+    @staticmethod
+    def _encode_name(name):
+        return (json.dumps(name) + "\n").encode("utf-8")
+
+    def _write_manifest(self, generation, version, count, deleted, data_bytes, names_bytes):
+        manifest = {
+            "version": version,
+            "generation": generation,
+            "storage": self.storage,
+            "dim": self._dim,
+            "count": count,
+            "deleted": deleted,
+            "data_bytes": data_bytes,
+            "names_bytes": names_bytes,
+        }
+        tmp_path = self.manifest_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_file)
+        self._manifest_stamp = self._read_stamp()
+
+    def _read_stamp(self):
+        try:
+            return os.stat(self.manifest_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read_manifest(self):
+        stamp = self._read_stamp()
+        try:
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            raise GalleryLoadError(f"Could not read {self.manifest_file}: {e}") from e
+        return manifest, stamp
+
+    # Hold the inter-process write lock (blocks while another process is writing)
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.gallery_dir, exist_ok=True)
+        with open(self.lock_file, "a+b") as f:
+            if os.name == "nt":
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after 10 seconds; keep waiting like flock does
+                        pass
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if os.name == "nt":
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    # Take both write locks and catch up with changes committed by other processes,
+    # so appends start at the real end of the files
+    @contextmanager
+    def _writing(self):
+        with self.lock, self._file_lock():
+            self._sync_manifest()
+            yield
+
+    # Reload the gallery if the manifest on disk is not the one this process last loaded or
+    # wrote (caller holds both locks). Returns True if it was reloaded.
+    def _sync_manifest(self):
+        manifest, stamp = self._read_manifest()
+        if manifest is None:
+            return False
+        same = manifest["version"] == self._version and manifest["generation"] == self._generation
+        self._manifest_stamp = stamp
+        if same:
+            return False
+        generation = self._generation
+        try:
+            self._load_manifest(manifest)
+        except Exception as e:
+            raise GalleryLoadError(f"Could not reload the face gallery in {self.gallery_dir}: {e}") from e
+        self.templates.clear()
+        # Same generation: only rows were appended or tombstoned, so the index stays valid
+        self._publish(build_index=self._generation != generation)
+        return True
+
+    # Pick up changes committed by another process (e.g. enrol.py while the app runs).
+    # Only the manifest's modification time is checked when nothing changed, and a search
+    # never waits: if this process is writing, the write itself catches up.
+    def refresh(self):
+        if self._read_stamp() == self._manifest_stamp:
+            return False
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            with self._file_lock():
+                return self._sync_manifest()
+        finally:
+            self.lock.release()
+
+    # Memory-map the committed full-precision rows (None if there are none)
+    def _map_full(self):
+        if not self._count or self._dim is None:
+            return None
+        return np.memmap(self._data_path(self._generation), dtype=np.float32, mode="r", shape=(self._count, self._dim))
+
+    # Memory-map the committed rows: (matrix searched, full-precision rows for re-ranking).
+    # Pages are shared through the OS page cache by every process that opens the gallery.
+    def _map_rows(self):
+        full = self._map_full()
+        if full is None:
+            return None, None
+        shape = full.shape
+        if self.storage not in CODE_DTYPES:
+            return full, full
+        codes = np.memmap(self._codes_path(self._generation), dtype=CODE_DTYPES[self.storage], mode="r", shape=shape)
+        scales = None
+        if self.storage == "int8":
+            scales = np.memmap(self._scales_path(self._generation), dtype=np.float32, mode="r", shape=(self._count,))
+        return QuantizedMatrix(codes, scales), full
+
+    # Publish a new snapshot; the IVF index is reused until the next compaction
+    def _publish(self, build_index=False):
+        previous = getattr(self, "snapshot", None)
+        index = None
+        if previous is not None and not build_index:
+            index = previous.engine.index
+        embeddings, full = self._map_rows()
+        engine = MatchEngine(
+            embeddings,
+            self._names,
+            self._valid[:self._count].copy(),
+            ann_min_size=self.ann_min_size if build_index else None,
+            index=index,
+            full=full
+        )
+        self.snapshot = GallerySnapshot(self._version, engine, len(self._rows))
+
+    # Load the committed gallery. A gallery that cannot be read raises GalleryLoadError and its
+    # files are left untouched: starting empty instead would let the next write overwrite them.
+    def load(self):
+        with self.lock, self._file_lock():
+            manifest, self._manifest_stamp = self._read_manifest()
+            if manifest is None:
+                self._reset()
+                self._publish(build_index=True)
+                return
+            try:
+                self._load_manifest(manifest)
+                self._publish(build_index=True)
+            except Exception as e:
+                raise GalleryLoadError(f"Could not load the face gallery in {self.gallery_dir}: {e}") from e
+            # Only once the current generation has loaded: everything else is left over from older ones
+            self._remove_stale_files()
+
+    def _load_manifest(self, manifest):
+        generation, count, dim = manifest["generation"], manifest["count"], manifest["dim"]
+        names = []
+        if count:
+            with open(self._names_path(generation), "rb") as f:
+                names = [json.loads(line) for line in f.read(manifest["names_bytes"]).splitlines()]
+            if len(names) != count:
+                raise ValueError("Gallery names do not match embeddings")
+        self._reset(generation, manifest["version"], dim, count, names, manifest["deleted"])
+        if count and manifest.get("storage", "float32") != self.storage:
+            # Stored in another format: write a new generation in this one (from the full-precision rows)
+            self._rewrite_alive()
+
+    # Delete data files of older generations (left behind if they were still mapped when replaced)
+    def _remove_stale_files(self):
+        if not os.path.isdir(self.gallery_dir):
+            return
+        current = {os.path.basename(path) for path in self._generation_files(self._generation)}
+        for file in os.listdir(self.gallery_dir):
+            prefix = file.split("-", 1)[0]
+            if prefix in ("embeddings", "names", "codes", "scales") and "-" in file and file not in current:
+                try:
+                    os.remove(os.path.join(self.gallery_dir, file))
+                except OSError:
+                    pass
+
+    # Write a fresh generation of the data files and switch the manifest to it.
+    # embeddings[rows] (all rows if rows is None) are copied in chunks, so a memory-mapped
+    # source is never loaded at once.
+    def _rewrite(self, names, embeddings, rows=None):
+        os.makedirs(self.gallery_dir, exist_ok=True)
+        generation = self._generation + 1
+        version = self._version + 1
+        count = len(names)
+        dim = embeddings.shape[1] if count else self._dim
+        encoded = b"".join(self._encode_name(name) for name in names)
+        old_files = self._generation_files(self._generation)
+        new_files = self._generation_files(generation)
+        handles = [open(path, "wb") for path in new_files]
+        try:
+            for start in range(0, count, REWRITE_CHUNK_ROWS):
+                chunk_rows = slice(start, start + REWRITE_CHUNK_ROWS) if rows is None else rows[start:start + REWRITE_CHUNK_ROWS]
+                chunk = np.ascontiguousarray(embeddings[chunk_rows], dtype=np.float32)
+                handles[0].write(chunk.tobytes())
+                if self.storage in CODE_DTYPES:
+                    codes, scales = quantize(chunk, self.storage)
+                    handles[2].write(codes.tobytes())
+                    if scales is not None:
+                        handles[3].write(scales.tobytes())
+            handles[1].write(encoded)
+            for f in handles:
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            for f in handles:
+                f.close()
+        self._dim = dim
+        data_bytes = count * (dim or 0) * 4
+        self._write_manifest(generation, version, count, [], data_bytes, len(encoded))
+        self._reset(generation, version, dim, count, names)
+        for path in old_files:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                # Still memory-mapped by an older snapshot (Windows); removed on the next load
+                pass
+
+    # Rewrite the current generation without its deleted rows
+    def _rewrite_alive(self):
+        alive = np.flatnonzero(self._valid[:self._count])
+        names = [self._names[row] for row in alive]
+        full = self._map_full()
+        if full is None:
+            full = np.zeros((0, self._dim or 0), dtype=np.float32)
+        self._rewrite(names, full, alive)
+
+    def _append_files(self, chunks):
+        os.makedirs(self.gallery_dir, exist_ok=True)
+        # Truncate first so a half-written append from a failed earlier call is overwritten
+        # (only when needed: a mapped file may not be truncated on every platform)
+        for path, offset, data in chunks:
+            with open(path, "a+b") as f:
+                if f.seek(0, os.SEEK_END) != offset:
+                    f.truncate(offset)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    # Add one face (or replace the face of an existing name) without touching the other rows
+    def add(self, name, embedding):
+        self.add_many([name], [embedding])
+
+    # Add several faces with one append and one manifest write (existing names are replaced)
+    def add_many(self, names, embeddings):
+        if len(names) == 0:
+            return
+        vectors = l2_normalize(np.stack(embeddings)).reshape(len(names), -1)
+        with self._writing():
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding has {vectors.shape[1]} values, gallery expects {self._dim}")
+            start = self._count
+            end = start + len(names)
+            rows = dict(self._rows)
+            replaced = []
+            for offset, name in enumerate(names):
+                old_row = rows.get(name)
+                if old_row is not None:
+                    replaced.append(old_row)
+                rows[name] = start + offset
+            deleted = self._deleted + replaced
+            encoded_names = b"".join(self._encode_name(name) for name in names)
+            chunks = [
+                (self._data_path(self._generation), self._data_bytes, vectors.tobytes()),
+                (self._names_path(self._generation), self._names_bytes, encoded_names),
+            ]
+            if self.storage in CODE_DTYPES:
+                codes, scales = quantize(vectors, self.storage)
+                chunks.append((self._codes_path(self._generation), start * codes.itemsize * self._dim, codes.tobytes()))
+                if scales is not None:
+                    chunks.append((self._scales_path(self._generation), start * 4, scales.tobytes()))
+
+            # 1. append to the data files, 2. commit by replacing the manifest
+            self._append_files(chunks)
+            self._write_manifest(
+                self._generation, self._version + 1, end, deleted,
+                self._data_bytes + vectors.nbytes, self._names_bytes + len(encoded_names)
+            )
+
+            # 3. update memory beyond the published rows, then publish the new snapshot
+            if end > len(self._valid):
+                capacity = max(len(self._valid) * 2, end)
+                valid = np.zeros(capacity, dtype=bool)
+                valid[:start] = self._valid[:start]
+                self._valid = valid
+            self._valid[start:end] = True
+            self._valid[replaced] = False
+            self._names.extend(names)
+            self._deleted = deleted
+            self._rows = rows
+            self._count = end
+            self._data_bytes += vectors.nbytes
+            self._names_bytes += len(encoded_names)
+            self._version += 1
+            self._publish()
+        if replaced or self._needs_reindex():
+            self._schedule_compaction()
+
+    # Tombstone a face; its row is physically removed by the background compaction
+    def remove(self, name):
+        with self._writing():
+            row = self._rows.get(name)
+            if row is None:
+                return False
+            deleted = self._deleted + [row]
+            self._write_manifest(
+                self._generation, self._version + 1, self._count, deleted,
+                self._data_bytes, self._names_bytes
+            )
+            self._valid[row] = False
+            self._deleted = deleted
+            del self._rows[name]
+            self._version += 1
+            self._publish()
+            self.templates.delete(name)
+        self._schedule_compaction()
+        return True
+
+    # Add a person from several enrolment embeddings: the (best) embeddings are kept as
+    # templates for re-ranking and their normalized mean is the centroid used for search
+    def add_identity(self, name, embeddings):
+        self.add_identities([name], [embeddings])
+
+    # Add several people at once (one gallery append for all of their centroids)
+    def add_identities(self, names, embeddings_per_name):
+        centroids = []
+        for name, embeddings in zip(names, embeddings_per_name):
+            templates = l2_normalize(np.stack(embeddings)[:TEMPLATES_PER_IDENTITY])
+            self.templates.put(name, templates)
+            centroids.append(identity_centroid(templates))
+        self.add_many(list(names), centroids)
+
+    def _needs_reindex(self):
+        engine = self.snapshot.engine
+        if self.ann_min_size is None or self._count < self.ann_min_size:
+            return False
+        if engine.index is None:
+            return True
+        return engine.unindexed_rows > engine.index.size * REINDEX_FRACTION
+
+    def _needs_compaction(self):
+        return bool(self._deleted) or self._needs_reindex()
+
+    # Rewrite the files without deleted rows and rebuild the search index.
+    # Recognition keeps using the previous snapshot until the new one is published.
+    def compact(self):
+        with self._writing():
+            if not self._needs_compaction():
+                return False
+            # Without tombstones the files are already compact: only the index is rebuilt
+            if self._deleted:
+                self._rewrite_alive()
+            self._publish(build_index=True)
+            return True
+
+    def _compact_loop(self):
+        while True:
+            with self._compact_lock:
+                if not self._compact_requested:
+                    self._compact_thread = None
+                    return
+                self._compact_requested = False
+            try:
+                self.compact()
+            except Exception:
+                # Tombstones stay valid; the next change retries the compaction
+                pass
+
+    # Run compaction in a background thread (requests made while it runs are coalesced)
+    def _schedule_compaction(self):
+        with self._compact_lock:
+            self._compact_requested = True
+            if self._compact_thread is None:
+                self._compact_thread = threading.Thread(target=self._compact_loop, name="gallery-compaction", daemon=True)
+                self._compact_thread.start()
+
+    # Re-rank centroid candidates by the distance to each person's closest template
+    # (people without templates keep their centroid distance; ties keep the centroid order)
+    def _rerank(self, probe, candidates):
+        reranked = []
+        for rank, (name, distance) in enumerate(candidates):
+            templates = self.templates.get(name)
+            if templates is not None and len(templates):
+                distance = float(np.min(1.0 - templates @ probe))
+            reranked.append((distance, rank, name))
+        reranked.sort()
+        return [(name, distance) for distance, _, name in reranked]
+
+    # Return the k closest registered faces as (name, distance), best first
+    def search(self, embedding, k=1):
+        with stage("match"):
+            probe = l2_normalize(embedding)
+            self.refresh()
+            candidates = self.snapshot.engine.top_k(probe, max(k, RERANK_CANDIDATES))
+            return self._rerank(probe, candidates)[:k]
+
+    # Return (name, distance) of the closest registered face, or None if nobody is within threshold
+    def match(self, embedding, threshold=COSINE_THRESHOLD):
+        candidates = self.search(embedding, 1)
+        if not candidates or candidates[0][1] > threshold:
+            return None
+        return candidates[0]
+
+    # Registered person closest to a new person's enrolment embeddings, as (name, distance),
+    # or None if nobody is within threshold. One top-1 query with their centroid.
+    def find_duplicate(self, embeddings, threshold=DUPLICATE_THRESHOLD):
+        return self.match(identity_centroid(embeddings), threshold)
+
+    # Best match within threshold for each of several probe embeddings
+    def match_many(self, embeddings, threshold=COSINE_THRESHOLD):
+        if len(embeddings) == 0:
+            return []
+        with stage("match"):
+            probes = l2_normalize(np.stack(embeddings))
+            self.refresh()
+            results = []
+            for probe, candidates in zip(probes, self.snapshot.engine.top_k_many(probes, RERANK_CANDIDATES)):
+                reranked = self._rerank(probe, candidates)
+                results.append(reranked[0] if reranked and reranked[0][1] <= threshold else None)
+            return results
+
+    # Gauges for the metrics export
+    def collect_metrics(self):
+        snapshot = self.snapshot
+        return [
+            ("face_gallery_identities", "gauge", snapshot.size, {}),
+            ("face_gallery_version", "gauge", snapshot.version, {}),
+            ("face_gallery_uses_ann", "gauge", int(snapshot.engine.uses_ann), {}),
+        ]
+
+    # Embed any photo in the registered folder that is not in the gallery yet (one-time migration
+    # for users registered before the gallery existed). embed_many is the worker pool's
+    # (workers.InferencePool.embed_many), so the face model is never loaded in this process.
+    # Photos without a usable face are remembered and only retried once the file changes.
+    def sync_with_folder(self, train_dir, embed_many):
+        registered = set(self.names)
+        pending = []
+        for file in sorted(os.listdir(train_dir)):
+            name = os.path.splitext(file)[0]
+            if name in registered:
+                continue
+            try:
+                stamp = os.stat(os.path.join(train_dir, file)).st_mtime_ns
+            except OSError:
+                continue
+            if self._sync_failed.get(file) != stamp:
+                pending.append((file, name, stamp))
+        added = 0
+        for start in range(0, len(pending), SYNC_BATCH_SIZE):
+            chunk = []
+            for file, name, stamp in pending[start:start + SYNC_BATCH_SIZE]:
+                try:
+                    with open(os.path.join(train_dir, file), "rb") as f:
+                        chunk.append((file, name, stamp, f.read()))
+                except OSError:
+                    self._sync_failed[file] = stamp
+            if not chunk:
+                continue
+            results = embed_many([photo for _, _, _, photo in chunk])
+            names, embeddings = [], []
+            for (file, name, stamp, _), (embedding, _, _) in zip(chunk, results):
+                if embedding is None:
+                    self._sync_failed[file] = stamp
+                else:
+                    names.append(name)
+                    embeddings.append(embedding)
+            self.add_many(names, embeddings)
+            added += len(names)
+        return added
+
+
+_gallery = None
+_gallery_lock = threading.Lock()
+
+
+# Function to get the shared gallery (loaded once per process)
+def get_gallery():
+    global _gallery
+    with _gallery_lock:
+        if _gallery is None:
+            _gallery = FaceGallery()
+            metrics.set_collector("gallery", _gallery.collect_metrics)
+        return _gallery
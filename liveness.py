@@ -0,0 +1,158 @@
+import cv2
+import numpy as np
+import metrics
+from metrics import stage
+
+# Captures are checked before the face is embedded; rejected ones never reach the model
+LIVENESS_CHECK = True
+# Faces narrower than this (pixels) are rejected: too far away to recognise or check reliably,
+# which is also how a phone held up at arm's length usually looks
+MIN_FACE_WIDTH = 80
+# Quality sub-scores (see quality.score_face) below which a capture is rejected
+MIN_BLUR_SCORE = 0.15
+MIN_BRIGHTNESS_SCORE = 0.2
+# Face texture is analysed on a square patch of this size (so the spectrum bins are round)
+LIVENESS_FACE_SIZE = 128
+# Photos of screens and prints show moiré: isolated peaks in the face's high-frequency spectrum.
+# Off until MOIRE_PEAK_RATIO has been calibrated on real captures from the kiosk camera
+# (bench.py --images reports the scores of live faces); the other checks do not depend on it
+MOIRE_CHECK = False
+# The spectrum is divided by its mean at each radius; a peak above this many times the mean is a pattern.
+# Uncalibrated starting value: set it above the highest score of live captures from your camera
+MOIRE_PEAK_RATIO = 15.0
+# Spatial frequency band searched for moiré, in cycles per pixel of the analysed crop
+MOIRE_BAND = (0.125, 0.45)
+# JPEG compresses 8x8 pixel blocks, whose edges put peaks at k/8 cycles per pixel along both axes
+# of the decoded frame; frequencies within this many spectrum bins of them are not searched
+JPEG_BLOCK_SIZE = 8
+JPEG_NOTCH_BINS = 1
+# Burst check (video): consecutive face crops of a live person always change a little (breathing,
+# blinks, small head movements); a still photo or a frozen replay changes less than this (0..255).
+# Uncalibrated starting value (still frames with camera noise score about 0.1 to 0.3): keep it below
+# the burst_motion scores bench.py --video reports for live people holding still. A rejected burst
+# is retried with the next one, so too high a value delays live people rather than locking them out.
+MIN_BURST_MOTION = 1.0
+BURST_FRAMES = 8
+BURST_SAMPLE_SIZE = (64, 64)
+# Counter with one series per rejection reason
+REJECTION_METRIC = "face_liveness_rejections_total"
+
+REJECTION_MESSAGES = {
+    "face_too_small": "face too far from the camera",
+    "blurry": "image too blurry",
+    "bad_lighting": "face too dark or too bright",
+    "screen_pattern": "looks like a photo of a screen or a print",
+    "no_motion": "no movement, looks like a still photo",
+}
+
+_fy = np.fft.fftfreq(LIVENESS_FACE_SIZE)[:, None]
+_fx = np.fft.rfftfreq(LIVENESS_FACE_SIZE)[None, :]
+_radius = np.hypot(_fy, _fx)
+_radius_bins = np.minimum((_radius.ravel() * LIVENESS_FACE_SIZE).astype(np.int64), LIVENESS_FACE_SIZE // 2)
+_bin_counts = np.maximum(np.bincount(_radius_bins, minlength=LIVENESS_FACE_SIZE // 2 + 1), 1)
+_window = cv2.createHanningWindow((LIVENESS_FACE_SIZE, LIVENESS_FACE_SIZE), cv2.CV_32F)
+
+
+def _face_gray(frame, box):
+    x, y, w, h = box
+    face = frame[max(0, y):y + h, max(0, x):x + w]
+    if face.size == 0:
+        return None
+    return cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+
+
+# Function to select the spectrum bins searched for moiré: the band minus the JPEG block harmonics.
+# scale_y and scale_x are how much the analysed crop was shrunk from the frame (< 1 when enlarged),
+# since resizing moves the harmonics to k/8 * scale cycles per pixel.
+def _moire_mask(scale_y=1.0, scale_x=1.0):
+    mask = (_radius >= MOIRE_BAND[0]) & (_radius <= MOIRE_BAND[1])
+    tolerance = (JPEG_NOTCH_BINS + 0.5) / LIVENESS_FACE_SIZE
+    for k in range(1, JPEG_BLOCK_SIZE // 2 + 1):
+        harmonic = k / JPEG_BLOCK_SIZE
+        mask &= np.abs(np.abs(_fy) - harmonic * scale_y) > tolerance
+        mask &= np.abs(_fx - harmonic * scale_x) > tolerance
+    return mask.ravel()
+
+
+_band = _moire_mask()
+
+
+# Function to measure how strongly periodic the face texture is: the largest high-frequency
+# spectrum peak relative to the mean magnitude at the same radius. Large faces are analysed on
+# a centre patch at full resolution, since shrinking them would blur the moiré away.
+def moire_score(gray):
+    n = LIVENESS_FACE_SIZE
+    height, width = gray.shape[:2]
+    if min(height, width) >= n:
+        y, x = (height - n) // 2, (width - n) // 2
+        face = gray[y:y + n, x:x + n].astype(np.float32)
+        band = _band
+    else:
+        face = cv2.resize(gray, (n, n), interpolation=cv2.INTER_LINEAR).astype(np.float32)
+        band = _moire_mask(height / n, width / n)
+    face -= face.mean()
+    face *= _window
+    magnitude = np.abs(np.fft.rfft2(face)).ravel()
+    radial_mean = np.bincount(_radius_bins, magnitude, minlength=len(_bin_counts)) / _bin_counts
+    return float((magnitude[band] / (radial_mean[_radius_bins[band]] + 1e-6)).max())
+
+
+def _check(frame, box, quality):
+    if box[2] < MIN_FACE_WIDTH:
+        return "face_too_small"
+    if quality is not None:
+        if quality["blur"] < MIN_BLUR_SCORE:
+            return "blurry"
+        if quality["brightness"] < MIN_BRIGHTNESS_SCORE:
+            return "bad_lighting"
+    gray = _face_gray(frame, box)
+    if gray is None:
+        return "face_too_small"
+    if MOIRE_CHECK and moire_score(gray) > MOIRE_PEAK_RATIO:
+        return "screen_pattern"
+    return None
+
+
+# Function to check one capture before its face is embedded (a few milliseconds, no model).
+# quality is quality.score_face's result for the box. Returns None if the capture may be embedded,
+# otherwise the rejection reason (also counted in REJECTION_METRIC).
+def check_capture(frame, box, quality=None):
+    if not LIVENESS_CHECK:
+        return None
+    with stage("liveness"):
+        reason = _check(frame, box, quality)
+    if reason is not None:
+        metrics.inc(REJECTION_METRIC, reason=reason)
+    return reason
+
+
+# Function to take the small grey sample of a face that the burst check compares across frames.
+# Pass the same box for every frame of a burst: a box that shifts by a few pixels changes the
+# sample about as much as a live face does.
+def burst_sample(frame, box):
+    gray = _face_gray(frame, box)
+    if gray is None:
+        return None
+    sample = cv2.resize(gray, BURST_SAMPLE_SIZE, interpolation=cv2.INTER_AREA)
+    # Smoothing removes most sensor noise, which would otherwise look like motion
+    return cv2.GaussianBlur(sample, (5, 5), 0).astype(np.float32)
+
+
+# Function to measure the largest mean absolute change between consecutive face samples
+def burst_motion(samples):
+    samples = [s for s in samples if s is not None]
+    if len(samples) < 2:
+        return None
+    return max(float(np.abs(b - a).mean()) for a, b in zip(samples, samples[1:]))
+
+
+# Function to check a burst of samples of the same face (from burst_sample). Returns None if
+# it moved like a live face (or there are too few samples to tell), otherwise the rejection reason.
+def check_burst(samples):
+    if not LIVENESS_CHECK:
+        return None
+    motion = burst_motion(samples)
+    if motion is not None and motion < MIN_BURST_MOTION:
+        metrics.inc(REJECTION_METRIC, reason="no_motion")
+        return "no_motion"
+    return None
@@ -0,0 +1,294 @@
+import numpy as np
+
+# Galleries with at least this many faces are searched with the approximate IVF index
+ANN_MIN_GALLERY_SIZE = 5000
+# Number of IVF lists probed per query (more lists = better recall, slower search)
+IVF_NPROBE = 8
+IVF_TRAIN_ITERATIONS = 10
+# Rows multiplied at once when assigning faces to IVF lists (keeps peak memory bounded)
+ASSIGN_CHUNK_SIZE = 8192
+# Rows converted to float32 at once while scanning quantized embeddings (small enough to stay in cache)
+QUANT_BLOCK_ROWS = 256
+# Quantized searches fetch this many candidates per requested result (at least REFINE_MIN)
+# and re-score them with the full-precision embeddings
+REFINE_FACTOR = 4
+REFINE_MIN = 16
+
+
+# Function to pick the k smallest distances, sorted best first.
+# Ties are broken by the lower row index so the same gallery always gives the same answer.
+def top_k_indices(distances, k):
+    n = len(distances)
+    if n == 0 or k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    k = min(k, n)
+    if k < n:
+        candidates = np.argpartition(distances, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, distances[candidates]))
+    return candidates[order]
+
+
+# Function to store unit-length rows compactly: float16, or int8 with one scale per row
+# (row = codes * scale). Returns (codes, scales); scales is None for float16.
+def quantize(vectors, dtype):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown quantized dtype: {dtype}")
+
+
+class QuantizedMatrix:
+    # Embedding rows stored as float16, or as int8 with one float32 scale per row.
+    # Codes may be memory-mapped; products are computed block by block in float32,
+    # so only QUANT_BLOCK_ROWS rows are ever converted at once.
+    def __init__(self, codes, scales=None):
+        self.codes = codes
+        self.scales = scales
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __getitem__(self, rows):
+        return QuantizedMatrix(self.codes[rows], self.scales[rows] if self.scales is not None else None)
+
+    def _block(self, start, end):
+        block = self.codes[start:end].astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:end, None]
+        return block
+
+    def to_float32(self):
+        return self._block(0, len(self))
+
+    # rows @ other, for a probe vector (d,) or a matrix (d, m); row scales are applied to the products
+    def __matmul__(self, other):
+        other = np.asarray(other, dtype=np.float32)
+        out = np.empty((len(self),) + other.shape[1:], dtype=np.float32)
+        for start in range(0, len(self), QUANT_BLOCK_ROWS):
+            end = start + QUANT_BLOCK_ROWS
+            out[start:end] = self.codes[start:end].astype(np.float32) @ other
+        if self.scales is not None:
+            out *= np.asarray(self.scales, dtype=np.float32).reshape((-1,) + (1,) * (out.ndim - 1))
+        return out
+
+
+# Function to get any embedding matrix (float32, memory-mapped or quantized) as a float32 array
+def as_float32(embeddings):
+    if isinstance(embeddings, QuantizedMatrix):
+        return embeddings.to_float32()
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+# Function to compute exact cosine distances between unit-length rows and a unit-length probe
+def cosine_distances(embeddings, probe):
+    return 1.0 - embeddings @ probe
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _assign(embeddings, centroids):
+    assign = np.empty(len(embeddings), dtype=np.int64)
+    for start in range(0, len(embeddings), ASSIGN_CHUNK_SIZE):
+        chunk = embeddings[start:start + ASSIGN_CHUNK_SIZE]
+        assign[start:start + ASSIGN_CHUNK_SIZE] = np.argmax(chunk @ centroids.T, axis=1)
+    return assign
+
+
+class IVFIndex:
+    # Inverted-file index: faces are clustered around nlist centroids (spherical k-means)
+    # and a query only scans the nprobe clusters closest to the probe.
+    # The lists hold row ids into the caller's matrix (float32, memory-mapped or quantized),
+    # so the index never keeps a copy of the embeddings; a query reads only the probed rows.
+    def __init__(self, embeddings, nlist=None, nprobe=IVF_NPROBE, iterations=IVF_TRAIN_ITERATIONS, seed=0):
+        if not isinstance(embeddings, QuantizedMatrix):
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+        n = len(embeddings)
+        if nlist is None:
+            nlist = int(np.sqrt(n))
+        self.size = n
+        self.nlist = max(1, min(nlist, n))
+        self.nprobe = max(1, min(nprobe, self.nlist))
+        self.centroids = self._train(embeddings, iterations, seed)
+
+        assign = _assign(embeddings, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        self.embeddings = embeddings
+        # Row ids grouped by list (ascending within each list)
+        self.ids = order
+        self.offsets = np.searchsorted(assign[order], np.arange(self.nlist + 1))
+
+    def _train(self, embeddings, iterations, seed):
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(embeddings), self.nlist * 64)
+        sample = as_float32(embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = _assign(sample, centroids)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=self.nlist)
+            non_empty = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            sums = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+            # Empty clusters keep their previous centroid
+            centroids[non_empty] = _normalize_rows(sums)
+        return centroids
+
+    # Top-k over the indexed rows; rows with valid[row] == False (deleted) are skipped
+    def search(self, probe, k=1, valid=None):
+        lists = top_k_indices(-(self.centroids @ probe), self.nprobe)
+        ids = np.concatenate([self.ids[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        # Sorted row ids read a mapped file in order and give the same tie-breaking as the exact search
+        ids = np.sort(ids)
+        distances = cosine_distances(self.embeddings[ids], probe)
+        if valid is not None:
+            distances[~valid[ids]] = np.inf
+        idx = top_k_indices(distances, k)
+        return ids[idx], distances[idx]
+
+
+class MatchEngine:
+    # Nearest-neighbour search over a matrix of unit-length embeddings.
+    # Small galleries use exact batched cosine distance; large ones use an IVF index.
+    # Rows appended after the index was built are searched exactly, and rows marked
+    # invalid (deleted) are never returned, so the index survives incremental updates.
+    # If embeddings is a QuantizedMatrix, full holds the same rows in float32 (typically
+    # memory-mapped) and the best candidates are re-scored with it.
+    def __init__(self, embeddings, names, valid=None, ann_min_size=ANN_MIN_GALLERY_SIZE,
+                 nprobe=IVF_NPROBE, index=None, full=None):
+        self.names = names
+        if embeddings is None or len(embeddings) == 0:
+            self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        elif isinstance(embeddings, QuantizedMatrix):
+            self.embeddings = embeddings
+        else:
+            self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.full = full if isinstance(self.embeddings, QuantizedMatrix) else None
+        self.valid = valid
+        self.index = index
+        if self.index is None and ann_min_size is not None and len(self.embeddings) >= ann_min_size:
+            self.index = IVFIndex(self.embeddings, nprobe=nprobe)
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @property
+    def uses_ann(self):
+        return self.index is not None
+
+    # Rows added since the IVF index was built (searched exactly)
+    @property
+    def unindexed_rows(self):
+        if self.index is None:
+            return len(self.embeddings)
+        return len(self.embeddings) - self.index.size
+
+    def _exact_distances(self, probe, start=0):
+        distances = cosine_distances(self.embeddings[start:], probe)
+        if self.valid is not None:
+            distances = np.where(self.valid[start:], distances, np.inf)
+        return distances
+
+    # Number of candidates to fetch for k results (more when they are re-scored at full precision)
+    def _fetch_count(self, k):
+        return k if self.full is None else max(k * REFINE_FACTOR, REFINE_MIN)
+
+    # Re-score quantized candidates with the full-precision rows and keep the best k
+    def _refine(self, probe, idx, distances, k):
+        # Sorted rows read the (memory-mapped) file in order and keep ties on the lower row
+        idx = np.sort(idx[np.isfinite(distances)])
+        exact = 1.0 - np.asarray(self.full[idx], dtype=np.float32) @ probe
+        best = top_k_indices(exact, k)
+        return idx[best], exact[best]
+
+    # Return up to k (name, distance) pairs, best first
+    def top_k(self, probe, k=1, exact=False):
+        if len(self.embeddings) == 0:
+            return []
+        requested, k = k, self._fetch_count(k)
+        if self.index is not None and not exact:
+            idx, distances = self.index.search(probe, k, self.valid)
+            start = self.index.size
+            if start < len(self.embeddings):
+                idx = np.concatenate([idx, np.arange(start, len(self.embeddings))])
+                distances = np.concatenate([distances, self._exact_distances(probe, start)])
+                best = top_k_indices(distances, k)
+                idx, distances = idx[best], distances[best]
+        else:
+            distances = self._exact_distances(probe)
+            idx = top_k_indices(distances, k)
+            distances = distances[idx]
+        if self.full is not None:
+            idx, distances = self._refine(probe, idx, distances, requested)
+        return [(self.names[i], float(d)) for i, d in zip(idx, distances) if np.isfinite(d)]
+
+    # Return the single closest (name, distance) within threshold, or None
+    def best_match(self, probe, threshold):
+        candidates = self.top_k(probe, 1)
+        if not candidates or candidates[0][1] > threshold:
+            return None
+        return candidates[0]
+
+    # Best match within threshold for each row of a probe matrix (None where nobody is close enough).
+    # The exact path scores all probes against the gallery in one matrix product.
+    def best_matches(self, probes, threshold):
+        probes = np.asarray(probes, dtype=np.float32)
+        if len(self.embeddings) == 0 or len(probes) == 0:
+            return [None] * len(probes)
+        if self.index is not None:
+            return [self.best_match(probe, threshold) for probe in probes]
+        if self.full is not None:
+            return [
+                candidates[0] if candidates and candidates[0][1] <= threshold else None
+                for candidates in self.top_k_many(probes, 1)
+            ]
+        distances = 1.0 - (self.embeddings @ probes.T).T
+        if self.valid is not None:
+            distances[:, ~self.valid] = np.inf
+        # argmin returns the first (lowest row) index on ties, like top_k_indices
+        best = np.argmin(distances, axis=1)
+        results = []
+        for row, idx in enumerate(best):
+            distance = float(distances[row, idx])
+            results.append((self.names[idx], distance) if distance <= threshold else None)
+        return results
+
+    # Up to k (name, distance) pairs for each row of a probe matrix.
+    # The exact path scores all probes against the gallery in one matrix product.
+    def top_k_many(self, probes, k=1):
+        probes = np.asarray(probes, dtype=np.float32)
+        if len(self.embeddings) == 0 or len(probes) == 0:
+            return [[] for _ in range(len(probes))]
+        if self.index is not None:
+            return [self.top_k(probe, k) for probe in probes]
+        distances = 1.0 - (self.embeddings @ probes.T).T
+        if self.valid is not None:
+            distances[:, ~self.valid] = np.inf
+        results = []
+        for probe, row in zip(probes, distances):
+            idx = top_k_indices(row, self._fetch_count(k))
+            scores = row[idx]
+            if self.full is not None:
+                idx, scores = self._refine(probe, idx, scores, k)
+            results.append([(self.names[i], float(d)) for i, d in zip(idx, scores) if np.isfinite(d)])
+        return results
@@ -0,0 +1,302 @@
+import os
+import time
+import bisect
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local metrics file in the Prometheus text format (e.g. for node_exporter's textfile collector)
+METRICS_FILE = "metrics.prom"
+METRICS_INTERVAL_SECONDS = 15
+# Set FACE_METRICS_PORT to also serve the same text on http://<host>:<port>/metrics
+METRICS_HOST = os.environ.get("FACE_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("FACE_METRICS_PORT", "0") or 0)
+# cProfile dumps of single requests. FACE_PROFILING=1 shows the app's "Profile next check-in" button
+PROFILING_ENABLED = os.environ.get("FACE_PROFILING", "0") == "1"
+PROFILE_DIR = "profiles"
+PROFILE_TOP_FUNCTIONS = 40
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Histogram with one series per hot-path stage (decode, detect, quality, embed, match, storage)
+STAGE_METRIC = "face_stage_seconds"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+class Registry:
+    # Counters and latency histograms of one process, plus collector callbacks that report
+    # gauges (gallery size, queue depth, cache hit rates, ...) when the metrics are exported
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        # (name, labels) -> per-bucket counts (last one is +Inf) followed by the sum of all values
+        self._histograms = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += seconds
+
+    # Context manager that observes how long its block took
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # Register (or replace) a callback returning [(name, type, value, labels), ...]
+    def set_collector(self, name, collect):
+        with self._lock:
+            self._collectors[name] = collect
+
+    # Take everything recorded so far and reset (used to ship a worker process's metrics to the server)
+    def drain(self):
+        with self._lock:
+            data = (self._counters, self._histograms)
+            self._counters, self._histograms = {}, {}
+        return data
+
+    # Add metrics drained from another process
+    def merge(self, data):
+        counters, histograms = data
+        with self._lock:
+            for key, amount in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + amount
+            for key, values in histograms.items():
+                current = self._histograms.get(key)
+                if current is None or len(current) != len(values):
+                    self._histograms[key] = list(values)
+                else:
+                    self._histograms[key] = [a + b for a, b in zip(current, values)]
+
+    # Per-stage count, mean and approximate p95 (upper bound of the bucket holding it), in milliseconds
+    def stage_summary(self, name=STAGE_METRIC):
+        with self._lock:
+            series = [(dict(labels), list(values)) for (metric, labels), values in self._histograms.items() if metric == name]
+        rows = []
+        for labels, values in sorted(series, key=lambda s: s[0].get("stage", "")):
+            counts, total = values[:-1], values[-1]
+            count = sum(counts)
+            if not count:
+                continue
+            seen = 0
+            p95 = float("inf")
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                seen += bucket_count
+                if seen >= 0.95 * count:
+                    p95 = bound
+                    break
+            rows.append({
+                "stage": labels.get("stage", ""),
+                "count": count,
+                "mean_ms": total / count * 1000.0,
+                "p95_ms": p95 * 1000.0,
+            })
+        return rows
+
+    def _collect(self):
+        with self._lock:
+            collectors = list(self._collectors.values())
+        samples = []
+        for collect in collectors:
+            try:
+                samples.extend(collect())
+            except Exception:
+                # A broken collector must never break the export of everything else
+                pass
+        return samples
+
+    # Render everything in the Prometheus text exposition format
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(values)) for key, values in self._histograms.items())
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), values in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        # Lines of one metric must be contiguous, so samples from different collectors are grouped by name
+        for name, kind, value, labels in sorted(self._collect(), key=lambda sample: sample[0]):
+            if value is None:
+                continue
+            declare(name, kind)
+            lines.append(f"{name}{_format_labels(sorted(labels.items()))} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of this process
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def observe(name, seconds, **labels):
+    registry.observe(name, seconds, **labels)
+
+
+def timer(name, **labels):
+    return registry.timer(name, **labels)
+
+
+# Function to time one hot-path stage, e.g. `with stage("detect"): ...`
+def stage(name):
+    return registry.timer(STAGE_METRIC, stage=name)
+
+
+# Startup phases of this process in seconds (imports, store, gallery, worker pool, first page)
+startup_phases = {}
+
+
+# Context manager that times one startup phase. Only the first run of each phase is recorded,
+# so wrapping code that runs again on every rerun (where it is a cached no-op) is fine.
+@contextmanager
+def startup_phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_phases.setdefault(name, time.perf_counter() - started)
+
+
+# Function to record a startup phase measured elsewhere (first value wins, like startup_phase)
+def record_startup_phase(name, seconds):
+    startup_phases.setdefault(name, seconds)
+
+
+def _collect_startup():
+    return [("face_startup_seconds", "gauge", seconds, {"phase": name}) for name, seconds in startup_phases.items()]
+
+
+registry.set_collector("startup", _collect_startup)
+
+
+def set_collector(name, collect):
+    registry.set_collector(name, collect)
+
+
+# Function to write the current metrics to a file (atomically, so scrapers never see half a file)
+def write_metrics_file(path=METRICS_FILE):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporter_lock = threading.Lock()
+_exporter_thread = None
+_http_server = None
+
+
+def _export_loop(path, interval):
+    while True:
+        try:
+            write_metrics_file(path)
+        except Exception:
+            pass
+        time.sleep(interval)
+
+
+# Function to start exporting metrics: the metrics file is rewritten every `interval` seconds and,
+# if a port is given, served over HTTP (only the first call per process does anything)
+def start_exporter(path=METRICS_FILE, interval=METRICS_INTERVAL_SECONDS, port=METRICS_PORT, host=METRICS_HOST):
+    global _exporter_thread, _http_server
+    with _exporter_lock:
+        if _exporter_thread is not None:
+            return
+        _exporter_thread = threading.Thread(target=_export_loop, args=(path, interval), name="metrics-exporter", daemon=True)
+        _exporter_thread.start()
+        if port:
+            try:
+                _http_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError:
+                # Port taken (e.g. by another server process); the metrics file is still written
+                _http_server = None
+            else:
+                threading.Thread(target=_http_server.serve_forever, name="metrics-http", daemon=True).start()
+
+
+# Context manager that runs its block under cProfile and dumps the result to PROFILE_DIR:
+# <label>-<timestamp>.prof (for pstats/snakeviz) and a .txt summary sorted by cumulative time.
+# The yielded dict gets the .prof path when the block ends.
+@contextmanager
+def profiled(label, enabled=True):
+    report = {"path": None}
+    if not enabled:
+        yield report
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield report
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{label}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}")
+        profiler.dump_stats(base + ".prof")
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        report["path"] = base + ".prof"
@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+import cv2
+import numpy as np
+
+MODEL_NAME = "VGG-Face"
+# Faces are detected and cropped with the bundled Haar cascade, so DeepFace must not detect again
+DETECTOR_BACKEND = "skip"
+CASCADE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "haarcascade_frontalface_default.xml")
+
+# Models are built once per server process and shared by every session and rerun
+_model_lock = threading.Lock()
+_detector_lock = threading.Lock()
+_import_lock = threading.Lock()
+_deepface = None
+_recognition_model = None
+_face_detector = None
+_warm_event = threading.Event()
+
+# Load time metrics (seconds), filled in as each stage finishes
+load_metrics = {
+    "deepface_import_seconds": None,
+    "model_load_seconds": None,
+    "detector_load_seconds": None,
+    "warmup_inference_seconds": None,
+    "warmup_total_seconds": None,
+    "warmup_error": None,
+}
+
+
+# Function to get the DeepFace module, importing it (and TensorFlow with it) on first use,
+# so pages and tools that never embed a face don't pay for the import
+def get_deepface():
+    global _deepface
+    with _import_lock:
+        if _deepface is None:
+            start = time.perf_counter()
+            from deepface import DeepFace
+            _deepface = DeepFace
+            load_metrics["deepface_import_seconds"] = time.perf_counter() - start
+        return _deepface
+
+
+def _build(model_name):
+    DeepFace = get_deepface()
+    try:
+        return DeepFace.build_model(model_name=model_name, task="facial_recognition")
+    except TypeError:
+        # Older deepface versions take no task argument
+        return DeepFace.build_model(model_name)
+
+
+# Function to get the recognition model, building it on first use
+def get_recognition_model():
+    global _recognition_model
+    with _model_lock:
+        if _recognition_model is None:
+            start = time.perf_counter()
+            _recognition_model = _build(MODEL_NAME)
+            load_metrics["model_load_seconds"] = time.perf_counter() - start
+        return _recognition_model
+
+
+# Function to get the Haar cascade face detector, loading it on first use
+def get_face_detector():
+    global _face_detector
+    with _detector_lock:
+        if _face_detector is None:
+            start = time.perf_counter()
+            detector = cv2.CascadeClassifier(CASCADE_FILE)
+            if detector.empty():
+                raise RuntimeError(f"Could not load face cascade from {CASCADE_FILE}")
+            _face_detector = detector
+            load_metrics["detector_load_seconds"] = time.perf_counter() - start
+        return _face_detector
+
+
+# Function to load both models and run one dummy inference so the first real request is fast
+def warm_up():
+    start = time.perf_counter()
+    try:
+        get_recognition_model()
+        get_face_detector()
+        inference_start = time.perf_counter()
+        get_deepface().represent(
+            np.zeros((224, 224, 3), dtype=np.uint8),
+            model_name=MODEL_NAME,
+            detector_backend=DETECTOR_BACKEND,
+            enforce_detection=False
+        )
+        load_metrics["warmup_inference_seconds"] = time.perf_counter() - inference_start
+    except Exception as e:
+        load_metrics["warmup_error"] = str(e)
+    finally:
+        load_metrics["warmup_total_seconds"] = time.perf_counter() - start
+        _warm_event.set()
+
+
+# Health flag: True once warm-up has finished
+def is_warm():
+    return _warm_event.is_set()
+
+
+# Function to report model state for the health indicator
+def get_health():
+    if not is_warm():
+        status = "warming"
+    elif load_metrics["warmup_error"]:
+        status = "failed"
+    else:
+        status = "ready"
+    return {"status": status, "warm": status == "ready", **load_metrics}
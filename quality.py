@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+from metrics import stage
+
+# Laplacian variance at or above this counts as fully sharp
+SHARP_LAPLACIAN_VAR = 100.0
+# Face width (pixels) at or above this counts as full size
+GOOD_FACE_WIDTH = 160
+# Faces are compared at this size so blur and pose scores do not depend on resolution
+QUALITY_FACE_SIZE = (112, 112)
+# Enrolment frames scoring below this are not used as templates
+MIN_ENROL_QUALITY = 0.25
+
+
+def _clip01(value):
+    return float(min(1.0, max(0.0, value)))
+
+
+# Function to score a detected face for blur, size, pose and brightness (each 0..1, higher is better).
+# "score" is the geometric mean of the four, so one very bad property pulls the whole score down.
+def score_face(frame, box):
+    with stage("quality"):
+        x, y, w, h = box
+        face = frame[max(0, y):y + h, max(0, x):x + w]
+        if face.size == 0:
+            return {"blur": 0.0, "size": 0.0, "pose": 0.0, "brightness": 0.0, "score": 0.0}
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+        gray = cv2.resize(gray, QUALITY_FACE_SIZE, interpolation=cv2.INTER_AREA)
+
+        blur = _clip01(cv2.Laplacian(gray, cv2.CV_64F).var() / SHARP_LAPLACIAN_VAR)
+        size = _clip01(w / GOOD_FACE_WIDTH)
+        brightness = _clip01(1.0 - abs(gray.mean() / 255.0 - 0.5) * 2.0)
+
+        # A frontal face is roughly left/right symmetric: correlate the left half with the mirrored right half
+        half = gray.shape[1] // 2
+        left = gray[:, :half].astype(np.float32).ravel()
+        right = np.fliplr(gray[:, -half:]).astype(np.float32).ravel()
+        left -= left.mean()
+        right -= right.mean()
+        denom = np.linalg.norm(left) * np.linalg.norm(right)
+        pose = _clip01(float(left @ right) / denom) if denom > 0 else 0.0
+
+        score = float((blur * size * pose * brightness) ** 0.25)
+        return {"blur": blur, "size": size, "pose": pose, "brightness": brightness, "score": score}
+
+
+# Function to pick the indices of the best n frames by quality score (skipping frames below
+# min_quality and frames rejected by the liveness check)
+def select_best(qualities, n, min_quality=MIN_ENROL_QUALITY):
+    ranked = [
+        i for i, q in enumerate(qualities)
+        if q is not None and not q.get("rejected") and q["score"] >= min_quality
+    ]
+    ranked.sort(key=lambda i: qualities[i]["score"], reverse=True)
+    return ranked[:n]
@@ -0,0 +1,291 @@
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+import cv2
+import numpy as np
+from detection import detect_faces, crop_face
+from gallery import get_gallery, compute_embedding
+from liveness import LIVENESS_CHECK, BURST_FRAMES, burst_sample, check_burst, check_capture
+
+# Run the (more expensive) cascade only on every Nth frame; faces are tracked in between
+DETECT_EVERY = 5
+# Frames are shrunk to this width for template tracking
+TRACK_MAX_WIDTH = 320
+# Search window around the previous box, as a fraction of the box size
+TRACK_SEARCH_MARGIN = 0.5
+# Below this template match score a track is counted as lost for the frame
+TRACK_MIN_SCORE = 0.5
+# A detection is the same face as a track if their boxes overlap at least this much
+IOU_MATCH_THRESHOLD = 0.3
+# Tracks not confirmed by this many detection rounds in a row are dropped
+MAX_MISSED_DETECTIONS = 2
+
+STAGES = ["read", "detect", "track", "liveness", "embed", "match"]
+
+
+# Function to read frames one by one from a webcam index or a video file
+def read_frames(source):
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video source: {source}")
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+# Function to compute intersection-over-union of two (x, y, w, h) boxes
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class StageTimer:
+    # Collects per-stage latencies (seconds) and the overall frame rate
+    def __init__(self, stages=STAGES):
+        self.samples = {stage: [] for stage in stages}
+        self.frames = 0
+        self.started = None
+        self.finished = None
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        stages = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            ms = np.asarray(values) * 1000.0
+            stages[stage] = {
+                "count": len(values),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+            }
+        return {
+            "frames": self.frames,
+            "seconds": elapsed,
+            "fps": self.frames / elapsed if elapsed > 0 else 0.0,
+            "stages": stages,
+        }
+
+
+class Track:
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.missed = 0
+        self.embedded = False
+        self.name = None
+        self.distance = None
+        # Burst of face samples for the liveness check, all taken at the box the burst started
+        # with (tracker jitter would otherwise look like motion), and the verdict of the last burst
+        # (a reason if rejected; the next burst is checked again)
+        self.samples = []
+        self.burst_box = None
+        self.rejected = None
+
+
+class FaceTracker:
+    # Keeps face tracks alive between detections with local template matching
+    # on a downscaled grey frame, and re-associates them with detections by IoU
+    def __init__(self):
+        self.tracks = []
+        self.next_id = 1
+        self.prev_small = None
+        self.scale = 1.0
+
+    def _small_gray(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape[:2]
+        self.scale = min(1.0, TRACK_MAX_WIDTH / width)
+        if self.scale < 1.0:
+            gray = cv2.resize(gray, (TRACK_MAX_WIDTH, int(round(height * self.scale))), interpolation=cv2.INTER_AREA)
+        return gray
+
+    def _follow(self, prev, curr, box):
+        s = self.scale
+        x, y, w, h = [int(round(v * s)) for v in box]
+        if w < 4 or h < 4:
+            return None
+        template = prev[max(0, y):y + h, max(0, x):x + w]
+        if template.shape[0] < 4 or template.shape[1] < 4:
+            return None
+        mx, my = int(w * TRACK_SEARCH_MARGIN), int(h * TRACK_SEARCH_MARGIN)
+        x1, y1 = max(0, x - mx), max(0, y - my)
+        x2, y2 = min(curr.shape[1], x + w + mx), min(curr.shape[0], y + h + my)
+        window = curr[y1:y2, x1:x2]
+        if window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1]:
+            return None
+        scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < TRACK_MIN_SCORE:
+            return None
+        return (int((x1 + bx) / s), int((y1 + by) / s), box[2], box[3])
+
+    # Move every track to its position in the new frame (no detection)
+    def track(self, frame):
+        small = self._small_gray(frame)
+        if self.prev_small is not None:
+            for track in self.tracks:
+                moved = self._follow(self.prev_small, small, track.box)
+                if moved is not None:
+                    track.box = moved
+        self.prev_small = small
+
+    # Match fresh detections to tracks; unmatched detections start new tracks
+    def update(self, frame, boxes):
+        self.prev_small = self._small_gray(frame)
+        unmatched = list(boxes)
+        for track in self.tracks:
+            best, best_iou = None, IOU_MATCH_THRESHOLD
+            for box in unmatched:
+                iou = box_iou(track.box, box)
+                if iou >= best_iou:
+                    best, best_iou = box, iou
+            if best is not None:
+                track.box = best
+                track.missed = 0
+                unmatched.remove(best)
+            else:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= MAX_MISSED_DETECTIONS]
+        new_tracks = []
+        for box in unmatched:
+            track = Track(self.next_id, box)
+            self.next_id += 1
+            self.tracks.append(track)
+            new_tracks.append(track)
+        return new_tracks
+
+
+# Generator: recognise faces in a video stream, yielding (frame_index, frame, tracks) per frame.
+# Each track is embedded and matched against the gallery only once, after a short burst of frames
+# has passed the liveness check (still photos and screens are never embedded).
+def recognize_stream(frames, gallery, detect_every=DETECT_EVERY, timer=None):
+    timer = timer or StageTimer()
+    tracker = FaceTracker()
+    timer.start()
+    frames = iter(frames)
+    burst_frames = BURST_FRAMES if LIVENESS_CHECK else 1
+    while True:
+        start = time.perf_counter()
+        item = next(frames, None)
+        if item is None:
+            break
+        index, frame = item
+        timer.add("read", time.perf_counter() - start)
+
+        if index % detect_every == 0:
+            start = time.perf_counter()
+            boxes = detect_faces(frame)
+            timer.add("detect", time.perf_counter() - start)
+            tracker.update(frame, boxes)
+        else:
+            start = time.perf_counter()
+            tracker.track(frame)
+            timer.add("track", time.perf_counter() - start)
+
+        for track in tracker.tracks:
+            if track.embedded:
+                continue
+            start = time.perf_counter()
+            if not track.samples:
+                track.burst_box = track.box
+            track.samples.append(burst_sample(frame, track.burst_box))
+            ready = len(track.samples) >= burst_frames
+            if ready:
+                # A rejected face is checked again on its next burst, so a live person who held
+                # still (or came closer) is only delayed, never rejected for the life of the track
+                track.rejected = check_burst(track.samples) or check_capture(frame, track.box)
+                track.samples = []
+            timer.add("liveness", time.perf_counter() - start)
+            if not ready or track.rejected:
+                continue
+            start = time.perf_counter()
+            embedding = compute_embedding(crop_face(frame, track.box))
+            timer.add("embed", time.perf_counter() - start)
+            start = time.perf_counter()
+            match = gallery.match(embedding) if embedding is not None else None
+            timer.add("match", time.perf_counter() - start)
+            track.embedded = True
+            if match:
+                track.name, track.distance = match
+
+        timer.frames += 1
+        yield index, frame, tracker.tracks
+    timer.finished = time.perf_counter()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Real-time face recognition on a webcam or video file")
+    parser.add_argument("--source", default="0", help="Webcam index (e.g. 0) or path to a video file")
+    parser.add_argument("--every", type=int, default=DETECT_EVERY, help="Run face detection on every Nth frame")
+    parser.add_argument("--max-frames", type=int, default=None, help="Stop after this many frames")
+    parser.add_argument("--mark", action="store_true", help="Mark attendance for recognised faces")
+    parser.add_argument("--display", action="store_true", help="Show the annotated video in a window")
+    args = parser.parse_args(argv)
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    gallery = get_gallery()
+    store = None
+    if args.mark:
+        from attendance_store import get_store
+        store = get_store()
+
+    timer = StageTimer()
+    recognized = {}
+    rejected = {}
+    for index, frame, tracks in recognize_stream(read_frames(source), gallery, args.every, timer):
+        for track in tracks:
+            # Faces whose last burst was rejected and that were never recognised
+            if track.embedded:
+                rejected.pop(track.id, None)
+            elif track.rejected:
+                rejected[track.id] = track.rejected
+            if track.name and track.name not in recognized:
+                now = datetime.now()
+                recognized[track.name] = now.strftime("%H:%M:%S")
+                if store is not None:
+                    store.mark_present(track.name, now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"))
+        if args.display:
+            for track in tracks:
+                x, y, w, h = track.box
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                label = track.name or (f"rejected: {track.rejected}" if track.rejected else "unknown")
+                cv2.putText(frame, label, (x, y - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            cv2.imshow("Face Recognition", frame)
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                break
+        if args.max_frames is not None and index + 1 >= args.max_frames:
+            break
+    if args.display:
+        cv2.destroyAllWindows()
+
+    report = timer.summary()
+    report["recognized"] = recognized
+    report["rejected_faces"] = {reason: list(rejected.values()).count(reason) for reason in sorted(set(rejected.values()))}
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
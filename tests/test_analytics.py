@@ -0,0 +1,65 @@
+import io
+import pytest
+import analytics
+from attendance_store import AttendanceStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AttendanceStore(str(tmp_path / "attendance.db"))
+    store.mark_present_many([
+        ("Alice", "2024-01-01", "09:00:00"),
+        ("Bob", "2024-01-01", "09:05:00"),
+        ("Alice", "2024-01-02", "09:00:00"),
+        ("Carol", "2024-01-02", "09:10:00"),
+        ("Bob", "2024-01-03", "08:55:00"),
+    ])
+    return store
+
+
+def test_summary_and_stats_come_from_the_aggregates(store):
+    assert analytics.get_summary(store) == {"total": 5, "unique_users": 3, "present": 5, "absent": 0}
+    assert analytics.get_daily_stats(store)["Date"].tolist() == ["2024-01-03", "2024-01-02", "2024-01-01"]
+    assert analytics.get_user_stats(store)[["Name", "Total"]].values.tolist() == [["Alice", 2], ["Bob", 2], ["Carol", 1]]
+    assert analytics.get_attendance_counts(store) == {"alice": 2, "bob": 2, "carol": 1}
+
+
+def test_filters(store):
+    assert analytics.count_records(store) == 5
+    assert analytics.count_records(store, names=["ALICE", "carol"]) == 3
+    assert analytics.count_records(store, date_str="2024-01-02") == 2
+    assert analytics.count_records(store, names=["Bob"], date_str="2024-01-02") == 0
+    assert analytics.count_records(store, status="Present") == 5
+    assert analytics.count_records(store, status="Absent") == 0
+    page = analytics.get_page(store, names=["Alice"])
+    assert page["Date"].tolist() == ["2024-01-02", "2024-01-01"]
+
+
+def test_pages_are_newest_first_and_do_not_overlap(store):
+    pages = [analytics.get_page(store, page=n, page_size=2) for n in (1, 2, 3)]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    names = [name for page in pages for name in page["Name"]]
+    assert names == ["Bob", "Carol", "Alice", "Bob", "Alice"]
+
+
+def test_new_record_invalidates_cached_results(store):
+    assert analytics.get_summary(store)["total"] == 5
+    hits = analytics.cache_stats()["hits"]
+    assert analytics.get_summary(store)["total"] == 5
+    assert analytics.cache_stats()["hits"] == hits + 1
+    store.mark_present("Dave", "2024-01-03", "09:30:00")
+    assert analytics.get_summary(store)["total"] == 6
+    assert analytics.count_records(store, date_str="2024-01-03") == 2
+    # A write that changes nothing keeps the cached results valid
+    store.mark_present("dave", "2024-01-03", "10:00:00")
+    hits = analytics.cache_stats()["hits"]
+    analytics.get_summary(store)
+    assert analytics.cache_stats()["hits"] == hits + 1
+
+
+def test_csv_export_streams_matching_rows(store):
+    chunks = list(analytics.iter_csv(store, names=["Bob"], chunk_size=1))
+    assert chunks[0] == "Name,Date,Time,Status\n"
+    assert "".join(chunks[1:]) == "Bob,2024-01-03,08:55:00,Present\nBob,2024-01-01,09:05:00,Present\n"
+    file = analytics.export_csv(store, io.BytesIO(), date_str="2024-01-01")
+    assert file.read().decode("utf-8").count("\n") == 3
@@ -0,0 +1,82 @@
+import pytest
+from attendance_store import AttendanceStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AttendanceStore(str(tmp_path / "attendance.db"))
+
+
+def test_mark_present_once_per_day(store):
+    assert store.mark_present("Alice", "2024-01-01", "09:00:00")
+    assert not store.mark_present("Alice", "2024-01-01", "17:00:00")
+    assert store.mark_present("Alice", "2024-01-02", "09:00:00")
+    assert store.count() == 2
+
+
+def test_mark_present_ignores_case_and_spaces(store):
+    assert store.mark_present("Alice", "2024-01-01", "09:00:00")
+    assert not store.mark_present(" alice ", "2024-01-01", "09:05:00")
+    records = store.records_for_date("2024-01-01")
+    assert records["Name"].tolist() == ["Alice"]
+    assert records["Time"].tolist() == ["09:00:00"]
+
+
+def test_mark_present_many_flags_each_entry(store):
+    store.mark_present("Bob", "2024-01-01", "08:00:00")
+    written = store.mark_present_many([
+        ("Alice", "2024-01-01", "09:00:00"),
+        ("BOB", "2024-01-01", "09:01:00"),
+        ("alice", "2024-01-01", "09:02:00"),
+    ])
+    assert written == [True, False, False]
+    assert store.count() == 2
+
+
+def test_mark_present_updates_aggregates_and_revision(store):
+    revision = store.revision()
+    store.mark_present("Alice", "2024-01-01", "09:00:00")
+    store.mark_present("Bob", "2024-01-01", "09:00:00")
+    store.mark_present("alice", "2024-01-01", "10:00:00")
+    assert store.revision() == revision + 2
+    daily = store.read_sql("SELECT present, total FROM daily_stats WHERE date = ?", ("2024-01-01",))
+    assert daily.iloc[0].tolist() == [2, 2]
+
+
+def test_delete_user_allows_marking_again(store):
+    store.mark_present("Alice", "2024-01-01", "09:00:00")
+    assert store.delete_user("ALICE") == 1
+    assert store.count() == 0
+    assert store.mark_present("Alice", "2024-01-01", "10:00:00")
+
+
+def _write_csv(path, text):
+    path.write_text("Name,Date,Time,Status\n" + text, encoding="utf-8")
+    return str(path)
+
+
+def test_import_csv_runs_once(tmp_path, store):
+    csv_path = _write_csv(tmp_path / "attendance.csv", "Alice,2024-01-01,09:00:00,Present\nBob,2024-01-01,09:01:00,Present\n")
+    assert store.import_csv(csv_path) == 2
+    assert store.import_csv(csv_path) == 0
+    assert store.count() == 2
+
+
+def test_import_csv_skips_damaged_rows(tmp_path, store):
+    # A row with an extra field, then a last line cut short inside a quote by a crash
+    csv_path = _write_csv(
+        tmp_path / "attendance.csv",
+        "Alice,2024-01-01,09:00:00,Present\nBob,2024-01-01,09:01:00,Present,x\n"
+        "Carol,2024-01-01,09:02:00,Present\n\"Dave,2024-01-01,09:0"
+    )
+    assert store.import_csv(csv_path) == 2
+    assert store.records_for_date("2024-01-01")["Name"].tolist() == ["Alice", "Carol"]
+
+
+def test_failed_import_is_retried(tmp_path, store):
+    csv_path = tmp_path / "attendance.csv"
+    csv_path.write_text("Who,When\nAlice,2024-01-01\n", encoding="utf-8")
+    with pytest.raises(KeyError):
+        store.import_csv(str(csv_path))
+    _write_csv(csv_path, "Alice,2024-01-01,09:00:00,Present\n")
+    assert store.import_csv(str(csv_path)) == 1
@@ -0,0 +1,56 @@
+from datetime import datetime
+import numpy as np
+import pytest
+import batch
+from attendance_store import AttendanceStore
+
+MORNING = datetime(2024, 1, 1, 9, 0, 0)
+NEXT_DAY = datetime(2024, 1, 2, 9, 0, 0)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AttendanceStore(str(tmp_path / "attendance.db"))
+
+
+def _faces(*names):
+    return [{"box": (0, 0, 10, 10), "name": name, "distance": None if name is None else 0.1} for name in names]
+
+
+def test_check_in_summary_counts(store):
+    store.mark_present("Carol", "2024-01-01", "08:00:00")
+    summary = batch.check_in([
+        (MORNING, _faces("Alice", "Bob", None)),
+        (MORNING, _faces("alice", "Carol")),
+        (MORNING, None),
+        (NEXT_DAY, _faces("Alice")),
+    ], store)
+    assert {key: value for key, value in summary.items() if key != "marked"} == {
+        "images": 4, "faces": 6, "matched": 3, "duplicate": 2, "unknown": 1, "unreadable": 1,
+    }
+    assert [(m["name"], m["date"]) for m in summary["marked"]] == [
+        ("Alice", "2024-01-01"), ("Bob", "2024-01-01"), ("Alice", "2024-01-02"),
+    ]
+    assert store.count() == 4
+
+
+class FakeGallery:
+    def match_many(self, embeddings):
+        return [("Alice", 0.1) if e[0] > 0 else None for e in embeddings]
+
+
+def test_recognize_frame_embeds_all_faces_in_one_call(monkeypatch):
+    calls = []
+    boxes = [(0, 0, 10, 10), (20, 0, 10, 10), (40, 0, 10, 10)]
+
+    def compute_embeddings(faces):
+        calls.append(len(faces))
+        # Second face has no usable embedding, third is a stranger
+        return [np.ones(4), None, -np.ones(4)]
+
+    monkeypatch.setattr(batch, "detect_faces", lambda frame: boxes)
+    monkeypatch.setattr(batch, "compute_embeddings", compute_embeddings)
+    faces = batch.recognize_frame(np.zeros((20, 60, 3), dtype=np.uint8), FakeGallery())
+    assert calls == [3]
+    assert [face["name"] for face in faces] == ["Alice", None, None]
+    assert [face["box"] for face in faces] == boxes
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import cache
+from cache import LRUCache, frame_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    lru = LRUCache(maxsize=2, ttl=None)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == (True, 1)
+    lru.put("c", 3)
+    assert lru.get("b") == (False, None)
+    assert lru.get("a") == (True, 1)
+    assert lru.get("c") == (True, 3)
+    assert lru.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1, "evictions": 1, "hit_rate": 0.75}
+
+
+def test_entries_expire_after_ttl(clock):
+    lru = LRUCache(maxsize=4, ttl=10)
+    lru.put("a", 1)
+    clock[0] += 10
+    assert lru.get("a") == (True, 1)
+    clock[0] += 0.5
+    assert lru.get("a") == (False, None)
+    assert len(lru) == 0
+    assert lru.stats()["evictions"] == 1
+    # Putting a key again restarts its clock
+    lru.put("a", 2)
+    clock[0] += 5
+    assert lru.get("a") == (True, 2)
+
+
+def test_frame_key_depends_on_content_and_shape():
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    assert frame_key(frame) == frame_key(frame.copy())
+    assert frame_key(frame) != frame_key(frame.reshape(4, 12))
+    assert frame_key(frame) != frame_key(frame + 1)
+    assert frame_key(b"photo") == frame_key(b"photo")
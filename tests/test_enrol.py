@@ -0,0 +1,36 @@
+import numpy as np
+from enrol import find_batch_duplicates
+
+DIM = 32
+
+
+def _people(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def test_distinct_people_have_no_duplicates():
+    assert find_batch_duplicates(_people(20), threshold=0.3) == {}
+
+
+def test_later_copies_point_at_the_first_person_kept():
+    people = _people(6)
+    people[3] = people[1] * 2.0
+    people[5] = people[1] + 0.01
+    duplicates = find_batch_duplicates(people, threshold=0.3)
+    assert sorted(duplicates) == [3, 5]
+    assert all(kept == 1 and distance < 0.01 for kept, distance in duplicates.values())
+
+
+def test_skipped_people_are_not_compared():
+    people = _people(4)
+    people[2] = people[0]
+    # Person 0 was already rejected (e.g. a duplicate of a registered face), so person 2 is kept
+    assert find_batch_duplicates(people, threshold=0.3, skip=[0]) == {}
+
+
+def test_chunked_distances_give_the_same_result():
+    people = _people(50)
+    people[40] = people[7]
+    people[45] = people[30]
+    assert find_batch_duplicates(people, threshold=0.3, chunk_size=8) == find_batch_duplicates(people, threshold=0.3)
+    assert sorted(find_batch_duplicates(people, threshold=0.3, chunk_size=8)) == [40, 45]
@@ -0,0 +1,162 @@
+import json
+import os
+import numpy as np
+import pytest
+from gallery import FaceGallery, GalleryLoadError
+
+DIM = 64
+
+
+def _vectors(n, seed=0):
+    return list(np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32))
+
+
+def _open(path, storage="float32"):
+    # ann_min_size=None: exact search, so matches do not depend on the IVF index
+    return FaceGallery(str(path), ann_min_size=None, storage=storage)
+
+
+def _manifest(path):
+    with open(os.path.join(str(path), "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_add_and_match(tmp_path):
+    gallery = _open(tmp_path)
+    vectors = _vectors(3)
+    gallery.add_many(["Alice", "Bob", "Carol"], vectors)
+    assert len(gallery) == 3
+    assert sorted(gallery.names) == ["Alice", "Bob", "Carol"]
+    name, distance = gallery.match(vectors[1])
+    assert name == "Bob"
+    assert distance == pytest.approx(0.0, abs=1e-5)
+    assert gallery.match(_vectors(1, seed=9)[0]) is None
+
+
+def test_add_replaces_existing_name(tmp_path):
+    gallery = _open(tmp_path)
+    old, new = _vectors(2)
+    gallery.add("Alice", old)
+    gallery.add("Alice", new)
+    assert len(gallery) == 1
+    assert gallery.match(new)[0] == "Alice"
+    assert gallery.match(old) is None
+
+
+def test_remove_then_compact(tmp_path):
+    gallery = _open(tmp_path)
+    vectors = _vectors(4)
+    gallery.add_many(["A", "B", "C", "D"], vectors)
+    assert gallery.remove("B")
+    assert not gallery.remove("B")
+    assert "B" not in gallery
+    assert gallery.match(vectors[1]) is None
+    # Compaction may already be running in the background; either way the end state is the same
+    gallery.compact()
+    manifest = _manifest(tmp_path)
+    assert manifest["count"] == 3 and manifest["deleted"] == []
+    assert [gallery.match(v)[0] for v in (vectors[0], vectors[2], vectors[3])] == ["A", "C", "D"]
+    data_files = sorted(f for f in os.listdir(tmp_path) if f.startswith(("embeddings-", "names-")))
+    generation = manifest["generation"]
+    assert data_files == [f"embeddings-{generation}.f32", f"names-{generation}.jsonl"]
+
+
+def test_reload_keeps_rows_and_tombstones(tmp_path):
+    gallery = _open(tmp_path)
+    vectors = _vectors(5)
+    gallery.add_many([f"p{i}" for i in range(5)], vectors)
+    gallery.remove("p3")
+    reloaded = _open(tmp_path)
+    assert sorted(reloaded.names) == ["p0", "p1", "p2", "p4"]
+    assert reloaded.match(vectors[4])[0] == "p4"
+    assert reloaded.match(vectors[3]) is None
+
+
+def test_reindex_only_compaction_keeps_the_files(tmp_path):
+    gallery = FaceGallery(str(tmp_path), ann_min_size=20)
+    vectors = _vectors(30)
+    gallery.add_many([f"p{i}" for i in range(30)], vectors)
+    # Compaction may already be running in the background; either way no file is rewritten
+    gallery.compact()
+    assert gallery.snapshot.engine.index is not None
+    assert _manifest(tmp_path)["generation"] == 0
+    assert gallery.match(vectors[7])[0] == "p7"
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_quantized_storage_reloads(tmp_path, storage):
+    gallery = _open(tmp_path, storage)
+    vectors = _vectors(5)
+    gallery.add_many([f"p{i}" for i in range(5)], vectors)
+    gallery.remove("p3")
+    reloaded = _open(tmp_path, storage)
+    assert sorted(reloaded.names) == ["p0", "p1", "p2", "p4"]
+    assert reloaded.match(vectors[4])[0] == "p4"
+    assert reloaded.match(vectors[3]) is None
+
+
+def test_storage_format_change_keeps_faces(tmp_path):
+    vectors = _vectors(3)
+    _open(tmp_path).add_many(["A", "B", "C"], vectors)
+    converted = _open(tmp_path, "int8")
+    assert [converted.match(v)[0] for v in vectors] == ["A", "B", "C"]
+    assert _manifest(tmp_path)["storage"] == "int8"
+
+
+def test_failed_load_leaves_files_untouched(tmp_path):
+    gallery = _open(tmp_path)
+    gallery.add_many(["A", "B"], _vectors(2))
+    names_file = os.path.join(str(tmp_path), "names-0.jsonl")
+    with open(names_file, "wb") as f:
+        f.write(b"not json\n")
+    before = {f: os.path.getsize(os.path.join(str(tmp_path), f)) for f in os.listdir(tmp_path)}
+    with pytest.raises(GalleryLoadError):
+        _open(tmp_path)
+    after = {f: os.path.getsize(os.path.join(str(tmp_path), f)) for f in os.listdir(tmp_path)}
+    assert after == before
+
+
+def test_two_instances_never_lose_each_others_rows(tmp_path):
+    first = _open(tmp_path)
+    second = _open(tmp_path)
+    vectors = _vectors(10)
+    for i in range(5):
+        first.add(f"first-{i}", vectors[i])
+        second.add(f"second-{i}", vectors[5 + i])
+    assert len(_open(tmp_path)) == 10
+    # Each instance also sees the rows the other one wrote
+    assert first.match(vectors[9])[0] == "second-4"
+    second.remove("first-0")
+    assert "first-0" not in first
+
+
+def test_find_duplicate_uses_the_centroid(tmp_path):
+    gallery = _open(tmp_path)
+    vectors = _vectors(3)
+    gallery.add_identities(["Alice", "Bob"], [[vectors[0], vectors[0] * 1.1], [vectors[1]]])
+    assert gallery.find_duplicate([vectors[0]])[0] == "Alice"
+    assert gallery.find_duplicate([vectors[2]]) is None
+
+
+def test_sync_with_folder_remembers_failed_photos(tmp_path):
+    train_dir = tmp_path / "registered"
+    train_dir.mkdir()
+    (train_dir / "Alice.jpg").write_bytes(b"alice")
+    (train_dir / "NoFace.jpg").write_bytes(b"noface")
+    vectors = dict(zip([b"alice", b"noface"], _vectors(2)))
+    calls = []
+
+    def embed_many(photos):
+        calls.append(list(photos))
+        return [(None if photo == b"noface" else vectors[photo], None, None) for photo in photos]
+
+    gallery = _open(tmp_path / "gallery")
+    assert gallery.sync_with_folder(str(train_dir), embed_many) == 1
+    assert gallery.sync_with_folder(str(train_dir), embed_many) == 0
+    assert calls == [[b"alice", b"noface"]]
+    assert gallery.names == ["Alice"]
+    # A replaced photo is tried again
+    stat = os.stat(train_dir / "NoFace.jpg")
+    os.utime(train_dir / "NoFace.jpg", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    gallery.sync_with_folder(str(train_dir), embed_many)
+    assert calls[-1] == [b"noface"]
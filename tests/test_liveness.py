@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+import pytest
+import liveness
+import metrics
+from liveness import burst_motion, burst_sample, check_burst, check_capture, moire_score
+
+GOOD_QUALITY = {"blur": 1.0, "brightness": 1.0}
+
+
+# Function to draw a smooth synthetic face: blurred texture on a bright blob
+def _face(size, seed=0):
+    rng = np.random.default_rng(seed)
+    face = cv2.GaussianBlur(rng.normal(128, 40, (size, size)).astype(np.float32), (0, 0), size / 20)
+    yy, xx = np.mgrid[:size, :size]
+    face += 60 * np.exp(-((yy - size / 2) ** 2 + (xx - size / 2) ** 2) / (2 * (size / 3) ** 2))
+    return np.clip(face, 0, 255).astype(np.uint8)
+
+
+def _jpeg(image, quality=75):
+    ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+
+
+def _frame(face):
+    frame = np.full((480, 640, 3), 100, dtype=np.uint8)
+    size = face.shape[0]
+    frame[100:100 + size, 200:200 + size] = face[:, :, None] if face.ndim == 2 else face
+    return frame, (200, 100, size, size)
+
+
+def _rejections(reason):
+    return metrics.registry._counters.get((liveness.REJECTION_METRIC, (("reason", reason),)), 0)
+
+
+def test_check_capture_rejects_small_blurry_and_dark_faces():
+    frame, box = _frame(_face(200))
+    assert check_capture(frame, box, GOOD_QUALITY) is None
+    before = _rejections("face_too_small")
+    assert check_capture(frame, (200, 100, 60, 60), GOOD_QUALITY) == "face_too_small"
+    assert _rejections("face_too_small") == before + 1
+    assert check_capture(frame, box, {"blur": 0.05, "brightness": 1.0}) == "blurry"
+    assert check_capture(frame, box, {"blur": 1.0, "brightness": 0.05}) == "bad_lighting"
+
+
+def test_check_capture_does_nothing_when_disabled(monkeypatch):
+    monkeypatch.setattr(liveness, "LIVENESS_CHECK", False)
+    frame, _ = _frame(_face(200))
+    assert check_capture(frame, (200, 100, 60, 60)) is None
+
+
+def test_screen_pattern_only_rejected_when_moire_check_is_on(monkeypatch):
+    face = _face(200).astype(np.float32)
+    yy, xx = np.mgrid[:200, :200]
+    face += 30 * np.sin(2 * np.pi * 0.3 * xx)
+    frame, box = _frame(np.clip(face, 0, 255).astype(np.uint8))
+    assert check_capture(frame, box, GOOD_QUALITY) is None
+    monkeypatch.setattr(liveness, "MOIRE_CHECK", True)
+    assert check_capture(frame, box, GOOD_QUALITY) == "screen_pattern"
+
+
+@pytest.mark.parametrize("size", [100, 240])
+def test_jpeg_block_edges_are_not_moire(size):
+    scores = [moire_score(_jpeg(_face(size, seed))) for seed in range(10)]
+    assert max(scores) < liveness.MOIRE_PEAK_RATIO
+
+
+def test_burst_of_a_still_frame_has_no_motion():
+    frame, box = _frame(_face(200))
+    noise = np.random.default_rng(0)
+    frames = [
+        np.clip(frame + noise.normal(0, 2, frame.shape), 0, 255).astype(np.uint8)
+        for _ in range(liveness.BURST_FRAMES)
+    ]
+    samples = [burst_sample(f, box) for f in frames]
+    assert burst_motion(samples) < liveness.MIN_BURST_MOTION
+    assert check_burst(samples) == "no_motion"
+
+
+def test_burst_of_a_changing_face_passes():
+    samples = []
+    for seed in range(liveness.BURST_FRAMES):
+        frame, box = _frame(_face(200, seed))
+        samples.append(burst_sample(frame, box))
+    assert check_burst(samples) is None
+    # Too few samples to tell
+    assert check_burst(samples[:1]) is None
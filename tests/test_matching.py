@@ -0,0 +1,82 @@
+import numpy as np
+from matching import MatchEngine, IVFIndex, QuantizedMatrix, quantize, top_k_indices
+
+DIM = 64
+
+
+def _unit_rows(n, seed=0):
+    rows = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def _probes(embeddings, n=40, seed=1):
+    rng = np.random.default_rng(seed)
+    probes = embeddings[rng.choice(len(embeddings), n, replace=False)]
+    return probes + rng.standard_normal(probes.shape).astype(np.float32) * 0.02
+
+
+def test_top_k_indices_breaks_ties_by_row():
+    distances = np.array([0.5, 0.1, 0.3, 0.1, 0.1], dtype=np.float32)
+    assert top_k_indices(distances, 2).tolist() == [1, 3]
+    assert top_k_indices(distances, 5).tolist() == [1, 3, 4, 2, 0]
+
+
+def test_ivf_probing_every_list_matches_exact_search():
+    embeddings = _unit_rows(2000)
+    # Duplicate rows tie exactly: both searches must return the lower row first
+    embeddings[1500] = embeddings[20]
+    names = [f"person-{i}" for i in range(len(embeddings))]
+    exact = MatchEngine(embeddings, names, ann_min_size=None)
+    ivf = MatchEngine(embeddings, names, ann_min_size=1000)
+    assert ivf.uses_ann and not exact.uses_ann
+    ivf.index.nprobe = ivf.index.nlist
+    for probe in np.vstack([embeddings[20:21], _probes(embeddings)]):
+        assert ivf.top_k(probe, 5) == exact.top_k(probe, 5)
+    assert [name for name, _ in ivf.top_k(embeddings[20], 2)] == ["person-20", "person-1500"]
+
+
+def test_ivf_index_is_deterministic():
+    embeddings = _unit_rows(3000)
+    probes = _probes(embeddings)
+    first = IVFIndex(embeddings)
+    second = IVFIndex(embeddings.copy())
+    np.testing.assert_array_equal(first.centroids, second.centroids)
+    for probe in probes:
+        ids_a, distances_a = first.search(probe, 5)
+        ids_b, distances_b = second.search(probe, 5)
+        np.testing.assert_array_equal(ids_a, ids_b)
+        np.testing.assert_array_equal(distances_a, distances_b)
+
+
+def test_ivf_finds_near_duplicates_and_skips_deleted_rows():
+    embeddings = _unit_rows(3000)
+    names = [f"person-{i}" for i in range(len(embeddings))]
+    valid = np.ones(len(embeddings), dtype=bool)
+    valid[7] = False
+    engine = MatchEngine(embeddings, names, valid, ann_min_size=1000)
+    assert engine.top_k(embeddings[8], 1)[0][0] == "person-8"
+    assert all(name != "person-7" for name, _ in engine.top_k(embeddings[7], 5))
+
+
+def test_quantized_ivf_reranks_with_full_precision_rows():
+    embeddings = _unit_rows(3000)
+    names = [f"person-{i}" for i in range(len(embeddings))]
+    codes, scales = quantize(embeddings, "int8")
+    exact = MatchEngine(embeddings, names, ann_min_size=None)
+    ivf = MatchEngine(QuantizedMatrix(codes, scales), names, ann_min_size=1000, full=embeddings)
+    ivf.index.nprobe = ivf.index.nlist
+    for probe in _probes(embeddings):
+        name, distance = ivf.top_k(probe, 1)[0]
+        expected_name, expected_distance = exact.top_k(probe, 1)[0]
+        assert name == expected_name
+        assert abs(distance - expected_distance) < 1e-5
+
+
+def test_ivf_index_keeps_no_copy_of_the_embeddings(tmp_path):
+    path = tmp_path / "embeddings.f32"
+    _unit_rows(3000).tofile(str(path))
+    mapped = np.memmap(str(path), dtype=np.float32, mode="r", shape=(3000, DIM))
+    index = IVFIndex(mapped)
+    # Lists are row ids into the mapped matrix
+    assert np.shares_memory(index.embeddings, mapped)
+    assert sorted(index.ids.tolist()) == list(range(3000))
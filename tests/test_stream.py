@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+import pytest
+import liveness
+import stream
+
+FACE_BOX = (100, 60, 120, 120)
+
+
+class FakeGallery:
+    def __init__(self):
+        self.probes = []
+
+    def match(self, embedding):
+        self.probes.append(embedding)
+        return "Alice", 0.1
+
+
+def _face_frame(rng):
+    frame = np.full((240, 320, 3), 90, dtype=np.uint8)
+    x, y, w, h = FACE_BOX
+    texture = cv2.GaussianBlur(rng.integers(0, 255, (h, w, 3), dtype=np.uint8), (0, 0), 3)
+    frame[y:y + h, x:x + w] = texture
+    return frame
+
+
+# Function to record a short clip: the same face for still_frames frames, then moving_frames frames
+# whose face texture changes every frame (what a live face does)
+def _write_clip(path, still_frames, moving_frames=0):
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 25, (320, 240))
+    still = _face_frame(rng)
+    for _ in range(still_frames):
+        writer.write(still)
+    for _ in range(moving_frames):
+        writer.write(_face_frame(rng))
+    writer.release()
+    return str(path)
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    calls = {"detect": 0, "embed": 0}
+
+    def detect_faces(frame):
+        calls["detect"] += 1
+        return [FACE_BOX]
+
+    def compute_embedding(face):
+        calls["embed"] += 1
+        return np.ones(8, dtype=np.float32)
+
+    monkeypatch.setattr(stream, "detect_faces", detect_faces)
+    monkeypatch.setattr(stream, "compute_embedding", compute_embedding)
+    return calls
+
+
+@pytest.fixture
+def no_liveness(monkeypatch):
+    monkeypatch.setattr(stream, "LIVENESS_CHECK", False)
+    monkeypatch.setattr(liveness, "LIVENESS_CHECK", False)
+
+
+def test_recorded_video_is_recognised_headless(tmp_path, fake_models, no_liveness):
+    clip = _write_clip(tmp_path / "clip.avi", 12)
+    gallery = FakeGallery()
+    timer = stream.StageTimer()
+    last_tracks = None
+    for index, frame, tracks in stream.recognize_stream(stream.read_frames(clip), gallery, detect_every=5, timer=timer):
+        last_tracks = tracks
+    assert timer.frames == 12
+    # Detection on frames 0, 5 and 10 only; the tracker follows the face in between
+    assert fake_models["detect"] == 3
+    # The face is embedded and matched once, not on every frame
+    assert fake_models["embed"] == 1
+    assert len(gallery.probes) == 1
+    assert [(track.name, track.box) for track in last_tracks] == [("Alice", FACE_BOX)]
+    report = timer.summary()
+    assert report["frames"] == 12
+
+
+def test_rejected_burst_is_retried(tmp_path, fake_models):
+    # Still for the first bursts (rejected: no motion), then the face starts moving
+    still_frames = 3 * liveness.BURST_FRAMES
+    clip = _write_clip(tmp_path / "clip.avi", still_frames, 2 * liveness.BURST_FRAMES)
+    gallery = FakeGallery()
+    verdicts = []
+    for index, frame, tracks in stream.recognize_stream(stream.read_frames(clip), gallery, detect_every=5):
+        verdicts.append((index, tracks[0].rejected, tracks[0].name))
+    assert ("no_motion" in {rejected for index, rejected, _ in verdicts if index < still_frames})
+    assert fake_models["embed"] == 1
+    assert verdicts[-1] == (verdicts[-1][0], None, "Alice")
+
+
+def test_still_clip_is_never_embedded(tmp_path, fake_models):
+    clip = _write_clip(tmp_path / "clip.avi", 4 * liveness.BURST_FRAMES)
+    for index, frame, tracks in stream.recognize_stream(stream.read_frames(clip), FakeGallery(), detect_every=5):
+        pass
+    assert fake_models["embed"] == 0
+    assert tracks[0].rejected == "no_motion"
@@ -0,0 +1,72 @@
+import os
+import time
+from concurrent.futures import TimeoutError
+import numpy as np
+import pytest
+from workers import InferencePool, QueueFullError
+
+
+@pytest.fixture
+def blocked_pool():
+    # One worker whose only slot is held by the test, so the dispatcher takes the first
+    # request off the queue and then waits: nothing reaches a worker until the slot is released
+    pool = InferencePool(num_workers=1, max_queue_size=2, batch_window=0, max_batch_size=1)
+    pool.slots.acquire()
+    yield pool
+    pool.slots.release()
+    pool.shutdown()
+
+
+def _frame(value):
+    return np.full((32, 32, 3), value, dtype=np.uint8)
+
+
+def _wait_for_empty_queue(pool):
+    deadline = time.monotonic() + 5
+    while pool.queue_depth and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_full_queue_rejects_new_requests(blocked_pool):
+    blocked_pool.submit(_frame(0))
+    _wait_for_empty_queue(blocked_pool)
+    blocked_pool.submit(_frame(1))
+    blocked_pool.submit(_frame(2))
+    with pytest.raises(QueueFullError):
+        blocked_pool.submit(_frame(3))
+    stats = blocked_pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 2
+
+
+def test_timed_out_request_is_cancelled(blocked_pool):
+    with pytest.raises(TimeoutError):
+        blocked_pool.embed(_frame(0), timeout=0.1)
+    assert blocked_pool.stats()["timed_out"] == 1
+    # Nothing was cached for the frame, so a retry is a real request again
+    assert blocked_pool.cache.stats()["size"] == 0
+
+
+def test_worker_threads_share_the_cores():
+    pool = InferencePool(num_workers=2)
+    try:
+        assert pool.threads == max(1, (os.cpu_count() or 1) // 2)
+        assert pool.stats()["threads_per_worker"] == pool.threads
+    finally:
+        pool.shutdown()
+
+
+def test_profiled_request_is_profiled_in_the_worker(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pool = InferencePool(num_workers=1, batch_window=0.2)
+    try:
+        others = [pool.submit(_frame(1)), pool.submit(_frame(2))]
+        (embedding, box, quality), path = pool.profile(_frame(0))
+        assert embedding is None and box is None
+        assert os.path.exists(path)
+        assert [future.result(timeout=30) for future in others] == [(None, None, None)] * 2
+        # One dump, for the profiled request only
+        assert len(os.listdir(tmp_path / "profiles")) == 2
+        assert pool.cache.stats()["size"] == 0
+    finally:
+        pool.shutdown()
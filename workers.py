@@ -0,0 +1,394 @@
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import metrics
+from cache import LRUCache, frame_key
+
+# Worker processes, each with its own preloaded copy of the model (several hundred MB of RAM each).
+# Default: one per core, leaving one core for the web server; FACE_WORKERS=1 on low-RAM kiosks
+NUM_WORKERS = int(os.environ.get("FACE_WORKERS", "0") or 0) or max(1, (os.cpu_count() or 2) - 1)
+# Threads each worker's TensorFlow / OpenMP / OpenCV may use. By default the cores are shared out
+# between the workers; left to themselves each would start one thread per core of the machine.
+WORKER_THREADS = int(os.environ.get("FACE_WORKER_THREADS", "0") or 0)
+# Read by TensorFlow and the math libraries when they are first imported
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS",
+]
+# Requests waiting for a worker; further requests are rejected instead of piling up
+MAX_QUEUE_SIZE = 64
+# Probes arriving within this window are sent to a worker as one batch
+BATCH_WINDOW_SECONDS = 0.005
+MAX_BATCH_SIZE = 16
+# Default time a caller waits for its result
+REQUEST_TIMEOUT_SECONDS = 30
+
+
+class QueueFullError(Exception):
+    pass
+
+
+# ---- Worker process side ----
+
+# Function to limit the threads of this process's numeric libraries; must run before TensorFlow is imported
+def _limit_threads(threads):
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+
+
+# Runs once in every worker process: limit its threads, preload the model, then report this
+# worker's (pid, health) to the server (also when warm-up failed)
+def _init_worker(health_queue, threads):
+    _limit_threads(threads)
+    from models import warm_up, get_health
+    warm_up()
+    health_queue.put((os.getpid(), get_health()))
+
+
+# Submitted once per worker so every process is started (and warms up) right away
+def _start_worker():
+    return os.getpid()
+
+
+# Function run inside a worker: detect the largest face in each frame, score its quality, reject
+# spoofed or unusable captures and embed the remaining crops in one batch. Items are encoded image
+# bytes or BGR arrays; returns one (embedding, box, quality) per item, all None when no face was found.
+# A rejected capture has no embedding and its quality has the reason under "rejected".
+def _process_batch(items):
+    from detection import decode_image, detect_largest_face, crop_face
+    from gallery import compute_embeddings
+    from quality import score_face
+    from liveness import check_capture
+    boxes = []
+    qualities = []
+    crops = []
+    for item in items:
+        frame = decode_image(item) if isinstance(item, (bytes, bytearray)) else item
+        box = detect_largest_face(frame) if frame is not None else None
+        quality = None
+        if box is not None:
+            quality = score_face(frame, box)
+            rejected = check_capture(frame, box, quality)
+            if rejected:
+                quality["rejected"] = rejected
+            else:
+                crops.append(crop_face(frame, box))
+        boxes.append(box)
+        qualities.append(quality)
+    embeddings = iter(compute_embeddings(crops))
+    return [
+        (None if quality is None or quality.get("rejected") else next(embeddings), box, quality)
+        for box, quality in zip(boxes, qualities)
+    ]
+
+
+# Same as _process_batch, but also returns the metrics recorded in this worker since the last
+# batch, so the server can merge them into its own (worker processes have no exporter).
+# With profile the batch runs under cProfile and the path of the dump is returned as well.
+def _process_batch_with_metrics(items, profile=False):
+    with metrics.profiled("checkin", enabled=profile) as report:
+        results = _process_batch(items)
+    return results, metrics.registry.drain(), report["path"]
+
+
+# ---- Server side ----
+
+class InferencePool:
+    # Request queue in front of a pool of worker processes. A dispatcher thread groups
+    # requests that arrive close together into micro-batches and keeps at most one batch
+    # per worker in flight; when the queue is full new requests are rejected (back-pressure).
+    def __init__(self, num_workers=NUM_WORKERS, max_queue_size=MAX_QUEUE_SIZE,
+                 batch_window=BATCH_WINDOW_SECONDS, max_batch_size=MAX_BATCH_SIZE, threads=WORKER_THREADS):
+        self.num_workers = num_workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // num_workers)
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.requests = queue.Queue(maxsize=max_queue_size)
+        # A profiled request that arrived while a batch was being collected; it is sent on its own next
+        self._held = None
+        self.slots = threading.BoundedSemaphore(num_workers)
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._stats_lock = threading.Lock()
+        # Results by frame content hash, so resubmitted photos and reruns skip the model
+        self.cache = LRUCache()
+        context = multiprocessing.get_context("spawn")
+        self._health_queue = context.Queue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._health_queue, self.threads)
+        )
+        metrics.set_collector("pool", self.collect_metrics)
+        self._closed = False
+        # Health reported by each worker process, by pid; ready once every worker has reported
+        self.ready = threading.Event()
+        self.worker_health = {}
+        # Set when a worker died: the executor then fails every request and has to be replaced
+        self.broken_error = None
+        threading.Thread(target=self._health_loop, name="inference-health", daemon=True).start()
+        # Start every worker now (each preloads its model) instead of on the first requests
+        for _ in range(num_workers):
+            self.executor.submit(_start_worker).add_done_callback(self._on_worker_started)
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="inference-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    @property
+    def queue_depth(self):
+        return self.requests.qsize()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "workers": self.num_workers,
+                "threads_per_worker": self.threads,
+                "queue_depth": self.queue_depth,
+                "in_flight_batches": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "cache": self.cache.stats(),
+            }
+
+    # Gauges and cumulative counters for the metrics export
+    def collect_metrics(self):
+        stats = self.stats()
+        health = self.health()
+        cache = stats["cache"]
+        return [
+            ("face_workers", "gauge", stats["workers"], {}),
+            ("face_workers_ready", "gauge", health["workers_ready"], {}),
+            ("face_model_warm", "gauge", int(health["warm"]), {}),
+            ("face_model_warmup_seconds", "gauge", health["warmup_total_seconds"], {}),
+            ("face_queue_depth", "gauge", stats["queue_depth"], {}),
+            ("face_inflight_batches", "gauge", stats["in_flight_batches"], {}),
+            ("face_requests_completed_total", "counter", stats["completed"], {}),
+            ("face_requests_rejected_total", "counter", stats["rejected"], {}),
+            ("face_requests_timed_out_total", "counter", stats["timed_out"], {}),
+            ("face_cache_hits_total", "counter", cache["hits"], {"cache": "probe"}),
+            ("face_cache_misses_total", "counter", cache["misses"], {"cache": "probe"}),
+            ("face_cache_hit_ratio", "gauge", cache["hit_rate"], {"cache": "probe"}),
+            ("face_cache_entries", "gauge", cache["size"], {"cache": "probe"}),
+        ]
+
+    @property
+    def broken(self):
+        return self.broken_error is not None
+
+    def _mark_broken(self, error):
+        with self._stats_lock:
+            if self.broken_error is None:
+                self.broken_error = str(error) or "A worker process died"
+
+    def _on_worker_started(self, done):
+        try:
+            done.result()
+        except BrokenProcessPool as e:
+            self._mark_broken(e)
+        except Exception:
+            pass
+
+    def _health_loop(self):
+        while not self._closed:
+            try:
+                pid, health = self._health_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            with self._stats_lock:
+                self.worker_health[pid] = health
+                if len(self.worker_health) >= self.num_workers:
+                    self.ready.set()
+
+    # Model state across all workers, in the same shape as models.get_health()
+    def health(self):
+        with self._stats_lock:
+            reports = list(self.worker_health.values())
+            broken_error = self.broken_error
+        errors = [h["warmup_error"] for h in reports if h.get("warmup_error")]
+        if broken_error:
+            errors.insert(0, broken_error)
+        if errors:
+            status = "failed"
+        elif not self.ready.is_set():
+            status = "warming"
+        else:
+            status = "ready"
+        load_times = [h["warmup_total_seconds"] for h in reports if h.get("warmup_total_seconds") is not None]
+        return {
+            "status": status,
+            "warm": status == "ready",
+            "workers_ready": sum(1 for h in reports if not h.get("warmup_error")),
+            "warmup_total_seconds": max(load_times) if load_times else None,
+            "warmup_error": errors[0] if errors else None,
+        }
+
+    # Queue a frame for recognition; returns a Future resolving to (embedding, box, quality).
+    # A profiled request resolves to ((embedding, box, quality), path of the cProfile dump).
+    def submit(self, item, profile=False):
+        future = Future()
+        try:
+            self.requests.put_nowait((item, future, time.perf_counter(), profile))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise QueueFullError("Recognition queue is full, please try again")
+        return future
+
+    # Recognise one frame and wait for the result (raises TimeoutError or QueueFullError)
+    def embed(self, item, timeout=REQUEST_TIMEOUT_SECONDS):
+        return self.embed_many([item], timeout)[0]
+
+    # Recognise several frames at once (they can share one micro-batch) and wait for all results.
+    # Frames seen recently are answered from the cache without touching a worker.
+    def embed_many(self, items, timeout=REQUEST_TIMEOUT_SECONDS):
+        keys = [frame_key(item) for item in items]
+        results = [None] * len(items)
+        futures = []
+        for i, key in enumerate(keys):
+            hit, value = self.cache.get(key)
+            if hit:
+                results[i] = value
+            else:
+                futures.append((i, self.submit(items[i])))
+        deadline = time.monotonic() + timeout
+        try:
+            for i, future in futures:
+                results[i] = future.result(timeout=max(0, deadline - time.monotonic()))
+                self.cache.put(keys[i], results[i])
+        except TimeoutError:
+            # Requests not dispatched yet will be skipped by the dispatcher
+            for _, future in futures:
+                future.cancel()
+            with self._stats_lock:
+                self.timed_out += 1
+            raise
+        return results
+
+    # Recognise one frame in a batch of its own, run under cProfile inside the worker (never from
+    # the cache). Returns ((embedding, box, quality), path of the .prof file).
+    def profile(self, item, timeout=REQUEST_TIMEOUT_SECONDS):
+        future = self.submit(item, profile=True)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            with self._stats_lock:
+                self.timed_out += 1
+            raise
+
+    def _collect_batch(self):
+        if self._held is not None:
+            item, self._held = self._held, None
+            return [item]
+        item = self.requests.get()
+        if item is None:
+            return None
+        batch = [item]
+        if item[3]:
+            return batch
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self.requests.put(None)
+                break
+            if item[3]:
+                self._held = item
+                break
+            batch.append(item)
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            # Wait for a free worker, then drop requests whose caller gave up in the meantime
+            self.slots.acquire()
+            dispatched = time.perf_counter()
+            for _, _, queued, _ in batch:
+                metrics.observe("face_queue_wait_seconds", dispatched - queued)
+            profile = batch[0][3]
+            batch = [(item, future) for item, future, _, _ in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                self.slots.release()
+                continue
+            with self._stats_lock:
+                self.in_flight += 1
+            try:
+                result = self.executor.submit(_process_batch_with_metrics, [item for item, _ in batch], profile)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._mark_broken(e)
+                self._finish(batch, None, e)
+                continue
+            result.add_done_callback(lambda done, batch=batch: self._on_done(batch, done))
+
+    def _on_done(self, batch, done):
+        try:
+            (results, worker_metrics, profile_path), error = done.result(), None
+            metrics.registry.merge(worker_metrics)
+            if profile_path:
+                results = [(results[0], profile_path)]
+        except Exception as e:
+            results, error = None, e
+            if isinstance(e, BrokenProcessPool):
+                self._mark_broken(e)
+        self._finish(batch, results, error)
+
+    def _finish(self, batch, results, error):
+        for i, (_, future) in enumerate(batch):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+        with self._stats_lock:
+            self.in_flight -= 1
+            self.completed += len(batch)
+        self.slots.release()
+
+    def shutdown(self):
+        if not self._closed:
+            self._closed = True
+            self.requests.put(None)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Function to get the shared inference pool (started once per server process). A pool whose
+# worker died can never run another request, so it is replaced by a fresh one.
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.broken:
+            _pool.shutdown()
+            _pool = None
+            metrics.inc("face_pool_restarts_total")
+        if _pool is None:
+            _pool = InferencePool()
+        return _pool
+
+
+# Function to get the shared inference pool if it has been started, without starting it
+def peek_pool():
+    return _pool